@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""Benchmark the package's hot paths on synthetic data.
+
+Each benchmark builds its data (outside the timing) in a temporary
+directory, then times the function's work in-process; network calls are
+answered from synthetic records, so results reflect our code rather than
+Reddit or Pushshift. Medians are saved per commit (in `.benchmarks/`)
+and compared against an earlier commit's; the exit status is 1 if any
+benchmark regressed beyond the threshold.
+
+    python benchmarks/hot_paths.py                 # compare with last saved
+    python benchmarks/hot_paths.py --save          # save results for HEAD
+    python benchmarks/hot_paths.py -a abc1234 df   # just construct_df, vs abc1234
+"""
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2024 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "0.1"
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from startup import ROOT, compare
+
+RESULTS_DIR = ROOT / ".benchmarks" / "hot-paths"
+Setup = Callable[[Path], Callable[[], object]]
+BENCHMARKS: dict[str, Setup] = {}
+
+
+def benchmark(name: str, **params) -> Callable[[Callable], Callable]:
+    """Register `setup(tmp_dir, **params)`, which returns the callable to time."""
+
+    def decorator(setup: Callable) -> Callable:
+        BENCHMARKS[name] = lambda tmp_dir: setup(tmp_dir, **params)
+        return setup
+
+    return decorator
+
+
+def base36(number: int) -> str:
+    """Return number in base 36, as Reddit ids are.
+
+    >>> base36(46655)
+    'zzz'
+    """
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    text = ""
+    while True:
+        number, digit = divmod(number, 36)
+        text = digits[digit] + text
+        if number == 0:
+            return text
+
+
+def fake_ids(rows: int) -> list[str]:
+    """Return distinct, Reddit-like submission ids."""
+    return [base36(36**5 + i) for i in range(rows)]
+
+
+def fake_text(rng: random.Random, words: int) -> str:
+    """Return words drawn from a small vocabulary, like an AITA title."""
+    vocabulary = ["my", "partner", "and", "I", "thank", "you", "AITA", "for", "a"]
+    return " ".join(rng.choices(vocabulary, k=words))
+
+
+def fake_submissions(rows: int, seed: int = 0) -> Iterator[dict]:
+    """Yield Pushshift-like submissions, some deleted, with demographics."""
+    rng = random.Random(seed)
+    start = 1_577_836_800  # 2020-01-01
+    for i, id_ in enumerate(fake_ids(rows)):
+        created = start + i * 60
+        age, gender = rng.randint(14, 70), rng.choice("FM")
+        selftext = rng.choice(
+            [
+                f"I ({age}{gender}) {fake_text(rng, 40)}",
+                fake_text(rng, 60),
+                "Thanks to u/bob for this update. Thankfully all is well.",
+                "[deleted]",
+                "[removed]",
+            ]
+        )
+        yield {
+            "id": id_,
+            "subreddit": "AmItheAsshole",
+            "author": rng.choice(["alice", "bob", "throwaway_ra", "[deleted]"]),
+            "title": f"AITA {fake_text(rng, 8)} {i}",
+            "selftext": selftext,
+            "created_utc": created,
+            "retrieved_on": created + rng.randint(60, 86400),
+            "score": rng.randint(0, 5000),
+            "num_comments": rng.randint(0, 900),
+            "full_link": f"https://www.reddit.com/r/AmItheAsshole/comments/{id_}/",
+            "url": f"https://www.reddit.com/r/AmItheAsshole/comments/{id_}/",
+            "permalink": f"/r/AmItheAsshole/comments/{id_}/",
+        }
+
+
+def fake_reddit_submission(post: dict, rng: random.Random) -> SimpleNamespace:
+    """Return a PRAW-like submission of post, perhaps since deleted or removed."""
+    fate = rng.random()
+    author, selftext, category = post["author"], post["selftext"], None
+    if fate < 0.1:
+        author = None
+    elif fate < 0.15:
+        selftext, category = "[deleted]", "deleted"
+    elif fate < 0.25:
+        selftext, category = "[removed]", "moderator"
+    return SimpleNamespace(
+        id=post["id"],
+        author=author,
+        title=post["title"],
+        selftext=selftext,
+        removed_by_category=category,
+    )
+
+
+class FakeReddit:
+    """Answers `info(fullnames=...)` as PRAW would, from synthetic posts."""
+
+    def __init__(self, posts: list[dict], seed: int = 0):
+        rng = random.Random(seed)
+        self.submissions = {p["id"]: fake_reddit_submission(p, rng) for p in posts}
+
+    def info(self, fullnames: list[str]) -> Iterator[SimpleNamespace]:
+        for fullname in fullnames:
+            if (sub := self.submissions.get(fullname.removeprefix("t3_"))) is not None:
+                yield sub
+
+
+@contextlib.contextmanager
+def quiet() -> Iterator[None]:
+    """Silence the prints and progress bars of the code being timed."""
+    with (
+        contextlib.redirect_stdout(io.StringIO()),
+        contextlib.redirect_stderr(io.StringIO()),
+    ):
+        yield
+
+
+@benchmark("construct_df[100k]", rows=100_000)
+@benchmark("construct_df[10k]", rows=10_000)
+def construct_df(tmp_dir: Path, rows: int) -> Callable:
+    """Time building the query dataframe, with Reddit records prefetched."""
+    from reddit_research import reddit_query
+    from reddit_research.submission_store import SubmissionRecord, SubmissionStore
+
+    posts = list(fake_submissions(rows))
+    reddit = FakeReddit(posts)
+    store_fn = tmp_dir / "prefetch.sqlite"
+    store = SubmissionStore(store_fn)
+    store.put_batch(
+        SubmissionRecord.from_submission(sub, fetched_utc=0)
+        for sub in reddit.submissions.values()
+    )
+    store.close()
+    args = argparse.Namespace(skip=False, throwaway_only=False)
+
+    def run() -> object:
+        with mock.patch.object(reddit_query, "PREFETCH_FN", store_fn):
+            return reddit_query.construct_df(args, rows, posts)
+
+    return run
+
+
+@benchmark("update_watch[50k]", rows=50_000)
+def update_watch(tmp_dir: Path, rows: int) -> Callable:
+    """Time a check of every row of a watch in the store, given Reddit's answers."""
+    import pandas as pd
+
+    from reddit_research import reddit_watch, watch_store, web_utils
+
+    posts = list(fake_submissions(rows))
+    frame = pd.DataFrame(
+        {
+            "id": [p["id"] for p in posts],
+            "subreddit": "AmItheAsshole",
+            "author_p": [p["author"] for p in posts],
+            "del_author_p": False,
+            "created_utc": "20200101 00:00:00",
+            "found_utc": "20200101 00:00:00",
+            "checked_utc": "20200101 00:00:00",
+            "del_author_r": False,
+            "del_author_r_utc": None,
+            "del_text_r": False,
+            "del_text_r_utc": None,
+            "rem_text_r": False,
+            "rem_text_r_utc": None,
+            "removed_by_category_r": False,
+        }
+    )
+    store = watch_store.WatchStore(tmp_dir / "watch.sqlite")
+    watch = watch_store.Watch(
+        "amitheasshole20200101", "AmItheAsshole", tmp_dir / "watch.csv", 0
+    )
+    store.add(watch, frame, 0)
+    reddit = FakeReddit(posts)
+    start = reddit_watch.NOW
+    checks = itertools.count()
+
+    def run() -> object:
+        # every row is due again by the longest interval between checks
+        now = start + next(checks) * reddit_watch.CHECK_MAX
+        with (
+            mock.patch.object(web_utils, "get_reddit", lambda: reddit),
+            mock.patch.multiple(
+                reddit_watch, NOW=now, NOW_STR=now.strftime("%Y%m%d %H:%M:%S")
+            ),
+        ):
+            return reddit_watch.update_store(store, watch, horizon_days=36500)
+
+    return run
+
+
+def write_parquet(path: Path, rows: int, seed: int = 0) -> None:
+    """Write synthetic submissions as a subreddit's Parquet dump."""
+    import pandas as pd
+
+    pd.DataFrame.from_records(list(fake_submissions(rows, seed))).to_parquet(path)
+
+
+@benchmark("demographics.process_subreddit[200k]", rows=200_000)
+def demographics(tmp_dir: Path, rows: int) -> Callable:
+    """Time extracting demographics from a subreddit's Parquet file."""
+    from reddit_research import reddit_demographics
+
+    parquet_fn = tmp_dir / "AmItheAsshole_submissions.parquet"
+    write_parquet(parquet_fn, rows)
+    return lambda: reddit_demographics.process_subreddit(parquet_fn, 2019, 2030)
+
+
+@benchmark("boro_thanks[2x100k]", rows=100_000)
+def boro_thanks(tmp_dir: Path, rows: int) -> Callable:
+    """Time loading, filtering, and checking BORU submissions for thanks."""
+    from reddit_research import reddit_boro_thanks
+
+    for seed, parquet_name in enumerate(reddit_boro_thanks.PARQUET_FILES):
+        write_parquet(tmp_dir / parquet_name, rows, seed)
+    return lambda: reddit_boro_thanks.main(["--data-dir", str(tmp_dir)])
+
+
+@benchmark("jsonl_get_post_url[200k]", rows=200_000)
+def jsonl_get_post_url(tmp_dir: Path, rows: int) -> Callable:
+    """Time finding a title near the end of a subreddit's JSONL dump."""
+    import zstandard as zstd
+
+    from reddit_research import redditors_from_subject
+
+    posts = list(fake_submissions(rows))
+    lines = "".join(json.dumps(post) + "\n" for post in posts)
+    dump_fn = tmp_dir / "AmItheAsshole_submissions.jsonl.zst"
+    dump_fn.write_bytes(zstd.ZstdCompressor().compress(lines.encode()))
+    title = posts[-10]["title"]
+    find = redditors_from_subject.jsonl_get_post_url.__wrapped__  # not cached
+
+    def run() -> object:
+        with mock.patch.object(redditors_from_subject, "DUMPS_PATH", tmp_dir):
+            return find("AmItheAsshole", title)
+
+    return run
+
+
+@benchmark("get_offsets[weighted,100k]", samples=100_000, sampler="weighted")
+@benchmark("get_offsets[quasi,100k]", samples=100_000, sampler="quasi")
+@benchmark("get_offsets[uniform,100k]", samples=100_000, sampler="uniform")
+@benchmark("get_offsets[uniform,10k]", samples=10_000, sampler="uniform")
+def get_offsets(tmp_dir: Path, samples: int, sampler: str) -> Callable:
+    """Time choosing sample offsets over five years of hourly counts."""
+    import pendulum
+
+    from reddit_research import reddit_sample
+
+    after = pendulum.datetime(2018, 1, 1)
+    before = pendulum.datetime(2023, 1, 1)
+    rng = random.Random(0)
+    counts = [rng.randint(0, 120) for _ in range((before - after).in_hours())]
+
+    def run() -> object:
+        with (
+            mock.patch.object(
+                reddit_sample, "get_pushshift_total", lambda *_: sum(counts)
+            ),
+            mock.patch.object(reddit_sample, "get_hourly_counts", lambda *_: counts),
+        ):
+            return reddit_sample.get_offsets(
+                "AmItheAsshole", after, before, samples, 100, sampler=sampler
+            )
+
+    return run
+
+
+@benchmark("unescape_XML[10MB]", size=10_000_000)
+@benchmark("unescape_XML[1MB]", size=1_000_000)
+def unescape_xml(tmp_dir: Path, size: int) -> Callable:
+    """Time unescaping text dense with character references and entities."""
+    from reddit_research import web_utils
+
+    chunk = "AITA &amp; my sister&#39;s &quot;wedding&quot; &#x2014; &eacute;t&eacute; "
+    text = chunk * (size // len(chunk))
+    return lambda: web_utils.unescape_XML(text)
+
+
+def measure(names: list[str], runs: int) -> dict[str, dict[str, float]]:
+    """Return the median milliseconds of each benchmark."""
+    results = {}
+    for name in names:
+        with tempfile.TemporaryDirectory() as tmp:
+            run = BENCHMARKS[name](Path(tmp))
+            timings = []
+            for _ in range(runs + 1):  # the first warms up, untimed
+                with quiet():
+                    start = time.perf_counter()
+                    run()
+                    timings.append((time.perf_counter() - start) * 1000)
+        results[name] = {"ms": round(statistics.median(timings[1:]), 1)}
+        print(f"{name:<40} {results[name]['ms']:>10}")
+    return results
+
+
+def get_commit() -> str:
+    """Return HEAD's short hash, marked if the tree has changes."""
+
+    def git(*args: str) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    commit = git("rev-parse", "--short", "HEAD")
+    return f"{commit}-dirty" if git("status", "--porcelain", "--", "src") else commit
+
+
+def find_baseline(against: str | None, commit: str) -> Path | None:
+    """Return saved results for `against`, else the latest of another commit."""
+    if against:
+        return next(RESULTS_DIR.glob(f"{against}*.json"), None)
+    saved = sorted(RESULTS_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+    others = [p for p in saved if p.stem != commit]
+    return others[-1] if others else None
+
+
+def process_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark hot paths on synthetic data, compared by commit."
+    )
+    parser.add_argument(
+        "-n",
+        "--runs",
+        type=int,
+        default=5,
+        help="runs per benchmark, median is reported (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="fractional slowdown counted as a regression (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--slack",
+        type=float,
+        default=5.0,
+        metavar="MS",
+        help="absolute slowdown ignored as noise (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-a",
+        "--against",
+        metavar="COMMIT",
+        help="compare with results saved for COMMIT (default: latest other)",
+    )
+    parser.add_argument(
+        "-s",
+        "--save",
+        action="store_true",
+        help=f"save results for this commit in {RESULTS_DIR.relative_to(ROOT)}/",
+    )
+    parser.add_argument(
+        "-l",
+        "--list",
+        action="store_true",
+        help="list benchmarks and exit",
+    )
+    parser.add_argument(
+        "names",
+        nargs="*",
+        help="run benchmarks whose names contain any of these (default: all)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Measure, report, and compare or save."""
+    args = process_args(argv)
+    names = [
+        name
+        for name in BENCHMARKS
+        if not args.names or any(part in name for part in args.names)
+    ]
+    if args.list:
+        print("\n".join(names))
+        return 0
+    commit = get_commit()
+    print(f"{'benchmark @ ' + commit:<40} {'ms':>10}")
+    results = measure(names, args.runs)
+
+    if args.save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        results_fn = RESULTS_DIR / f"{commit}.json"
+        saved = json.loads(results_fn.read_text()) if results_fn.exists() else {}
+        results_fn.write_text(json.dumps(saved | results, indent=2) + "\n")
+        print(f"saved results to {results_fn}")
+    if (baseline_fn := find_baseline(args.against, commit)) is None:
+        print(f"no earlier results in {RESULTS_DIR}; run with --save")
+        return 0
+    baseline = json.loads(baseline_fn.read_text())
+    print(f"\ncompared with {baseline_fn.stem}:")
+    for name, measures in results.items():
+        if (old := baseline.get(name, {}).get("ms")) is not None:
+            print(f"  {name:<38} {old:>10} -> {measures['ms']} ms")
+    if regressions := compare(results, baseline, args.threshold, args.slack):
+        print("\nREGRESSIONS:")
+        print("\n".join(f"  {regression}" for regression in regressions))
+        return 1
+    print("\nno regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Benchmark the cold start of every console script.
+
+For each entry in pyproject's `[project.scripts]`, measure in fresh
+interpreters (a) the cumulative import time of its module, per
+`python -X importtime`, and (b) the wall time of running it with `--help`.
+Medians are compared against a saved baseline and the exit status is 1
+if any script regressed beyond the threshold, or if importing it loads
+a heavy dependency that should be imported lazily.
+
+    python benchmarks/startup.py          # compare with baseline
+    python benchmarks/startup.py --save   # record a new baseline
+"""
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2024 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "0.1"
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+import tomllib
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_FN = ROOT / ".benchmarks" / "startup-baseline.json"
+# dependencies scripts load only when used, via `web_utils.lazy_import`
+LAZY = ("numpy", "pandas", "praw", "pyarrow", "requests")
+
+
+def get_scripts() -> dict[str, str]:
+    """Return {script name: module} from pyproject's [project.scripts]."""
+    pyproject = tomllib.loads((ROOT / "pyproject.toml").read_text())
+    return {
+        name: entry.split(":")[0]
+        for name, entry in pyproject["project"]["scripts"].items()
+    }
+
+
+def time_import(module: str) -> float:
+    """Return milliseconds to import `module` cold, per `-X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # lines are "import time: self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    raise RuntimeError(f"{module} not in importtime output")
+
+
+def eager_imports(module: str) -> list[str]:
+    """Return those of LAZY that importing `module` loads, in a fresh process."""
+    code = f"import sys, {module}\nprint(*(m for m in {LAZY!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    )
+    return result.stdout.split()
+
+
+def time_help(name: str, module: str) -> float:
+    """Return milliseconds of wall time for `name --help` in a fresh process."""
+    code = (
+        f"import sys; sys.argv = [{name!r}, '--help']\n"
+        f"from {module} import main\n"
+        "try:\n    main()\nexcept SystemExit:\n    pass"
+    )
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def measure(scripts: dict[str, str], runs: int) -> dict[str, dict[str, float]]:
+    """Return median import and `--help` milliseconds for each script."""
+    results = {}
+    for name, module in scripts.items():
+        imports = [time_import(module) for _ in range(runs)]
+        helps = [time_help(name, module) for _ in range(runs)]
+        results[name] = {
+            "import_ms": round(statistics.median(imports), 1),
+            "help_ms": round(statistics.median(helps), 1),
+        }
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+    slack_ms: float,
+) -> list[str]:
+    """Return descriptions of measures slower than baseline beyond threshold.
+
+    >>> compare({"a": {"help_ms": 150.0}}, {"a": {"help_ms": 100.0}}, 0.2, 10)
+    ['a help_ms: 150.0 ms vs 100.0 ms baseline (+50%)']
+    >>> compare({"a": {"help_ms": 105.0}}, {"a": {"help_ms": 100.0}}, 0.2, 10)
+    []
+    """
+    regressions = []
+    for name, measures in results.items():
+        for measure_name, value in measures.items():
+            if (old := baseline.get(name, {}).get(measure_name)) is None:
+                continue
+            if value > old * (1 + threshold) + slack_ms:
+                regressions.append(
+                    f"{name} {measure_name}: {value} ms vs {old} ms baseline"
+                    f" ({value / old - 1:+.0%})"
+                )
+    return regressions
+
+
+def process_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark cold start of each console script."
+    )
+    parser.add_argument(
+        "-n",
+        "--runs",
+        type=int,
+        default=5,
+        help="runs per measure, median is reported (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="fractional slowdown counted as a regression (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--slack",
+        type=float,
+        default=15.0,
+        metavar="MS",
+        help="absolute slowdown ignored as noise (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-s",
+        "--save",
+        action="store_true",
+        help=f"save results as the new baseline ({BASELINE_FN.name})",
+    )
+    parser.add_argument(
+        "scripts",
+        nargs="*",
+        help="console scripts to measure (default: all)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Measure, report, and compare or save."""
+    args = process_args(argv)
+    scripts = get_scripts()
+    if args.scripts:
+        scripts = {name: scripts[name] for name in args.scripts}
+    results = measure(scripts, args.runs)
+
+    print(f"{'script':<24} {'import ms':>10} {'--help ms':>10}")
+    for name, measures in results.items():
+        print(f"{name:<24} {measures['import_ms']:>10} {measures['help_ms']:>10}")
+
+    if args.save:
+        BASELINE_FN.parent.mkdir(exist_ok=True)
+        BASELINE_FN.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"saved baseline to {BASELINE_FN}")
+        return 0
+    regressions = [
+        f"{name} imports {', '.join(eager)} on startup"
+        for name, module in scripts.items()
+        if (eager := eager_imports(module))
+    ]
+    if BASELINE_FN.exists():
+        baseline = json.loads(BASELINE_FN.read_text())
+        regressions += compare(results, baseline, args.threshold, args.slack)
+    else:
+        print(f"no baseline at {BASELINE_FN}; run with --save")
+    if regressions:
+        print("\nREGRESSIONS:")
+        print("\n".join(f"  {regression}" for regression in regressions))
+        return 1
+    print("\nno regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Per-subreddit daily submission counts, for totals over any range of days.
+
+`reddit_sample.get_pushshift_total` sums stored days and only asks
+Pushshift for the days it hasn't counted yet.
+"""
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2009-2023 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "1.0"
+
+import logging
+import sqlite3
+import time
+from collections.abc import Iterable
+from pathlib import Path
+
+from reddit_research.response_store import CACHE_DIR
+
+log = logging.getLogger("count_store")
+
+COUNTS_FN = CACHE_DIR / "day-counts.sqlite"
+DAY = 86400  # seconds; days are numbered from the epoch, in UTC
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS day_counts (
+    subreddit TEXT NOT NULL,  -- lowercased
+    day INTEGER NOT NULL,  -- days since epoch
+    count INTEGER NOT NULL,
+    fetched INTEGER NOT NULL,
+    PRIMARY KEY (subreddit, day)
+);
+"""
+
+
+def missing_runs(days: Iterable[int]) -> list[tuple[int, int]]:
+    """Return sorted days as runs of consecutive days, [first, last).
+
+    >>> missing_runs([3, 4, 5, 9, 11, 12])
+    [(3, 6), (9, 10), (11, 13)]
+    >>> missing_runs([])
+    []
+    """
+    runs: list[tuple[int, int]] = []
+    for day in sorted(days):
+        if runs and runs[-1][1] == day:
+            runs[-1] = (runs[-1][0], day + 1)
+        else:
+            runs.append((day, day + 1))
+    return runs
+
+
+class DayCountStore:
+    """SQLite table of submissions per (subreddit, day)."""
+
+    def __init__(self, path: Path = COUNTS_FN):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def get(self, subreddit: str, first: int, last: int) -> dict[int, int]:
+        """Return {day: count} of stored days in [first, last)."""
+        rows = self._db.execute(
+            "SELECT day, count FROM day_counts"
+            " WHERE subreddit = ? AND day >= ? AND day < ?",
+            (subreddit.lower(), first, last),
+        )
+        return dict(rows.fetchall())
+
+    def put(self, subreddit: str, counts: dict[int, int]) -> None:
+        """Store {day: count}, replacing earlier counts of those days."""
+        now = int(time.time())
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO day_counts VALUES (?, ?, ?, ?)",
+                ((subreddit.lower(), day, n, now) for day, n in counts.items()),
+            )
+        log.info(f"stored {len(counts)} day counts for {subreddit}")
@@ -0,0 +1,306 @@
+"""Append-only log of watched submissions' changes, for any past snapshot.
+
+Rather than archiving a full copy of a watch CSV every run,
+`reddit_watch` records only the values that changed, as (id, field,
+old, new, observed_utc) events, per watch. An id's first events, with
+old NULL, are its baseline. `checked_utc`, which changes at every check
+of an id, is not logged but reconstructed from a compact table of when
+each id was checked and returned by Reddit.
+"""
+
+from __future__ import annotations
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2022-2023 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "1.0"
+
+import contextlib as cl
+import datetime as dt
+import logging
+import re
+import sqlite3
+import zipfile
+from collections.abc import Iterator
+from pathlib import Path
+
+from reddit_research import web_utils
+
+pd = web_utils.lazy_import("pandas")
+
+log = logging.getLogger("event_log")
+
+CHECKED = "checked_utc"  # reconstructed from checks rather than logged
+FOUND = "found"  # pseudo-field, "False" while Reddit doesn't return the id
+UTC_FORMAT = "%Y%m%d %H:%M:%S"  # of timestamps in watch CSVs
+LATEST = 2**62  # observed_utc beyond any run
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    watch TEXT NOT NULL,  -- as in a `watch_store`, or '' in a watch's own log
+    id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    old TEXT,  -- NULL for NA, and in an id's baseline
+    new TEXT,
+    observed_utc INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_found ON events (watch, id)
+    WHERE field = 'found';
+-- ids Reddit returned when checked
+CREATE TABLE IF NOT EXISTS checks (
+    watch TEXT NOT NULL,
+    id TEXT NOT NULL,
+    observed_utc INTEGER NOT NULL,
+    PRIMARY KEY (watch, id, observed_utc)
+) WITHOUT ROWID;
+"""
+
+
+def as_text(values: pd.Series) -> pd.Series:
+    """Return values as written to a watch CSV, with None for NA.
+
+    >>> as_text(pd.Series([True, float("nan"), "moderator"])).tolist()
+    ['True', None, 'moderator']
+    """
+    return values.astype(object).map(str).where(values.notna(), None)
+
+
+def changes(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Return (id, field, old, new) of values differing between aligned frames.
+
+    >>> before = pd.DataFrame({"id": ["a", "b"], "del_text_r": [False, False],
+    ...     "del_text_r_utc": [None, None], "checked_utc": ["t0", "t0"]})
+    >>> after = before.assign(checked_utc="t1")
+    >>> after.loc[1, ["del_text_r", "del_text_r_utc"]] = [True, "t1"]
+    >>> changes(before, after).to_dict("records")  # doctest: +NORMALIZE_WHITESPACE
+    [{'id': 'b', 'field': 'del_text_r', 'old': 'False', 'new': 'True'},
+     {'id': 'b', 'field': 'del_text_r_utc', 'old': None, 'new': 't1'}]
+    """
+    parts = []
+    for field in after.columns.drop(["id", CHECKED], errors="ignore"):
+        # compare as text only what differs as read, e.g., False and "False"
+        candidate = (before[field] != after[field]) & (
+            before[field].notna() | after[field].notna()
+        )
+        old = as_text(before.loc[candidate, field])
+        new = as_text(after.loc[candidate, field])
+        differ = (old != new) & (old.notna() | new.notna())
+        parts.append(
+            pd.DataFrame(
+                {
+                    "id": after.loc[differ.index[differ], "id"],
+                    "field": field,
+                    "old": old[differ],
+                    "new": new[differ],
+                }
+            )
+        )
+    if not parts:
+        return pd.DataFrame(columns=["id", "field", "old", "new"])
+    return pd.concat(parts, ignore_index=True)
+
+
+def utc_timestamp(utc_str: str) -> int:
+    """Return the epoch seconds of a watch CSV timestamp.
+
+    >>> utc_timestamp("19700102 00:00:00")
+    86400
+    """
+    return int(
+        dt.datetime.strptime(utc_str, UTC_FORMAT).replace(tzinfo=dt.UTC).timestamp()
+    )
+
+
+class EventLog:
+    """SQLite log of a watch's ids' field changes, and of their checks."""
+
+    def __init__(
+        self, path: Path, db: sqlite3.Connection | None = None, watch: str = ""
+    ):
+        self.path = path
+        self.watch = watch  # the events of other watches sharing the log are ignored
+        if db is None:
+            db = sqlite3.connect(path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+        # else a store's connection, with SCHEMA, so updates and events commit together
+        self._db = db
+
+    @cl.contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Commit the block, unless it's within a transaction begun by a store."""
+        if self._db.in_transaction:
+            yield
+        else:
+            with self._db:
+                yield
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __len__(self) -> int:
+        """Return the number of events."""
+        return self._db.execute(
+            "SELECT COUNT(*) FROM events WHERE watch = ?", (self.watch,)
+        ).fetchone()[0]
+
+    def ids(self) -> set[str]:
+        """Return the ids with a baseline."""
+        rows = self._db.execute(
+            "SELECT DISTINCT id FROM events WHERE watch = ?", (self.watch,)
+        )
+        return {row[0] for row in rows}
+
+    def missing_ids(self) -> set[str]:
+        """Return ids Reddit didn't return in their latest check."""
+        rows = self._db.execute(
+            "SELECT id FROM events WHERE rowid IN (SELECT MAX(rowid) FROM events"
+            " WHERE watch = ? AND field = 'found' GROUP BY id) AND new = 'False'",
+            (self.watch,),
+        )
+        return {row[0] for row in rows}
+
+    def add_baseline(self, frame: pd.DataFrame, observed_utc: int) -> int:
+        """Record every field of the rows whose ids are new; return their count."""
+        return self.baseline(frame[~frame["id"].isin(self.ids())], observed_utc)
+
+    def baseline(self, new: pd.DataFrame, observed_utc: int) -> int:
+        """Record every field of rows known to be new; return their count."""
+        if new.empty:
+            return 0
+        # row by row, so snapshots keep the rows' order
+        baseline = new.set_index("id").stack(future_stack=True)
+        with self._transaction():
+            self._db.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, NULL, ?, ?)",
+                (
+                    (self.watch, id_, field, new_value, observed_utc)
+                    for (id_, field), new_value in as_text(baseline).items()
+                ),
+            )
+        return len(new)
+
+    def record(
+        self,
+        before: pd.DataFrame,
+        after: pd.DataFrame,
+        found: pd.Series,
+        observed_utc: int,
+    ) -> int:
+        """Record a check of after's ids: values changed, and which were found.
+
+        Return the number of events recorded.
+        """
+        return self.append(
+            changes(before, after), found.set_axis(after["id"]), observed_utc
+        )
+
+    def append(self, events: pd.DataFrame, found: pd.Series, observed_utc: int) -> int:
+        """Record a check: changed values, and ids Reddit returned or not.
+
+        events has columns id, field, old, and new; found is bool by
+        checked id. Return the number of events recorded.
+        """
+        missing = self.missing_ids()
+        lost = set(found.index[~found]) - missing
+        returned = set(found.index[found]) & missing
+        rows = [
+            *zip(
+                events["id"], events["field"], events["old"], events["new"], strict=True
+            ),
+            *((id_, FOUND, "True", "False") for id_ in sorted(lost)),
+            *((id_, FOUND, "False", "True") for id_ in sorted(returned)),
+        ]
+        with self._transaction():
+            self._db.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)",
+                ((self.watch, *row, observed_utc) for row in rows),
+            )
+            self._db.executemany(  # in key order, which inserts faster
+                "INSERT OR IGNORE INTO checks VALUES (?, ?, ?)",
+                ((self.watch, id_, observed_utc) for id_ in sorted(found.index[found])),
+            )
+        return len(rows)
+
+    def snapshot(self, at: int = LATEST) -> pd.DataFrame:
+        """Return the watch CSV's rows as of time at, as text.
+
+        An id's `checked_utc` is the last check at which Reddit returned
+        it, or its baseline's if none has since.
+        """
+        events = pd.DataFrame(
+            self._db.execute(
+                "SELECT id, field, new, observed_utc FROM events"
+                " WHERE watch = ? AND observed_utc <= ? ORDER BY rowid",
+                (self.watch, at),
+            ).fetchall(),
+            columns=["id", "field", "new", "observed_utc"],
+        )
+        if events.empty:
+            return pd.DataFrame()
+        latest = events.drop_duplicates(["id", "field"], keep="last")
+        is_found = latest["field"] == FOUND
+        ids = events["id"].drop_duplicates()
+        fields = events.loc[events["field"] != FOUND, "field"].drop_duplicates()
+        frame = (
+            latest[~is_found]
+            .pivot(index="id", columns="field", values="new")
+            .reindex(index=ids, columns=fields)
+        )
+
+        checks = dict(
+            self._db.execute(
+                "SELECT id, MAX(observed_utc) FROM checks"
+                " WHERE watch = ? AND observed_utc <= ? GROUP BY id",
+                (self.watch, at),
+            ).fetchall()
+        )
+        last_utc = pd.Series(checks, dtype="int64").reindex(ids).fillna(-1)
+        last_check = pd.Series(
+            [
+                dt.datetime.fromtimestamp(utc, dt.UTC).strftime(UTC_FORMAT)
+                if utc >= 0
+                else None
+                for utc in last_utc
+            ],
+            index=frame.index,
+            dtype=object,
+        )
+        if CHECKED in frame:
+            # strings in UTC_FORMAT sort by time, and after "" for none
+            both = pd.concat([frame[CHECKED], last_check], axis=1).fillna("")
+            latest_check = both.max(axis=1)
+            frame[CHECKED] = latest_check.where(latest_check != "", None)
+        return frame.reset_index().rename_axis(None, axis=1)
+
+    def import_archive(self, zipped_fn: Path, latest_fn: Path | None = None) -> int:
+        """Log the history held in a watch's `*-arch.zip` of full snapshots.
+
+        Each snapshot is observed at its latest `checked_utc`; the
+        current CSV, latest_fn, is the last. Return the checks recorded.
+        """
+        with zipfile.ZipFile(zipped_fn) as archive:
+            # `updated-*.csv` repeats the first run's result, stamped later
+            stamped = sorted(
+                (int(match[1]), name)
+                for name in archive.namelist()
+                if (match := re.search(r"-arch_(\d+)\.csv$", name))
+            )
+            snapshots = [
+                pd.read_csv(archive.open(name), encoding="utf-8-sig", index_col=0)
+                for _, name in stamped
+            ]
+        if latest_fn is not None and latest_fn.exists():
+            snapshots.append(pd.read_csv(latest_fn, encoding="utf-8-sig", index_col=0))
+        previous = None
+        for snapshot in snapshots:
+            observed_utc = utc_timestamp(snapshot[CHECKED].max())
+            self.add_baseline(snapshot, observed_utc)
+            if previous is not None:
+                before = previous.set_index("id").reindex(snapshot["id"])
+                before = before.reset_index().set_axis(snapshot.index)
+                found = snapshot[CHECKED] == snapshot[CHECKED].max()
+                self.record(before, snapshot, found, observed_utc)
+            previous = snapshot
+        log.info(f"imported {len(snapshots)} snapshots from {zipped_fn}")
+        return max(len(snapshots) - 1, 0)
@@ -0,0 +1,194 @@
+"""Write dataframes as CSV, Parquet, or Arrow IPC (Feather), in one or more parts.
+
+Each writer accepts successive frames with the same columns: CSV appends
+rows, Parquet adds a row group, and Feather adds a record batch. So a
+whole frame can be written at once, or a large one streamed in batches.
+"""
+
+from __future__ import annotations
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2009-2023 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "1.0"
+
+import abc
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ClassVar
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+log = logging.getLogger("frame_writers")
+
+FORMATS = ("csv", "parquet", "feather")
+EXTENSIONS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".ipc": "feather",
+}
+COMPRESSION = "zstd"
+
+
+def format_of(path: Path, fmt: str | None = None) -> str:
+    """Return the format asked for, else the one implied by path, else CSV.
+
+    >>> format_of(Path("out.parquet"))
+    'parquet'
+    >>> format_of(Path("out.parquet"), "feather")
+    'feather'
+    >>> format_of(Path("out"))
+    'csv'
+    """
+    if fmt is not None:
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt=}; expected one of {FORMATS}")
+        return fmt
+    return EXTENSIONS.get(path.suffix.lower(), "csv")
+
+
+class FrameWriter(abc.ABC):
+    """Base writer; use as a context manager and `write()` frames to it."""
+
+    extension: ClassVar[str] = ""
+    typed: ClassVar[bool] = False  # keeps dtypes, so takes typed frames
+
+    def __init__(
+        self,
+        path: Path,
+        schema: pa.Schema | None = None,
+        drop: tuple[str, ...] = (),
+    ):
+        self.path = path
+        self.drop = drop  # e.g., columns implied by a partition's directory
+        for name in drop:
+            if schema is not None and (index := schema.get_field_index(name)) >= 0:
+                schema = schema.remove(index)
+        self.schema = schema
+        self.rows = 0
+
+    def __enter__(self) -> FrameWriter:
+        """Return self."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close, even on error, so what was written is readable."""
+        self.close()
+
+    def write(self, df: pd.DataFrame) -> None:
+        self._write(df.drop(columns=list(self.drop)) if self.drop else df)
+        self.rows += len(df)
+
+    @abc.abstractmethod
+    def _write(self, df: pd.DataFrame) -> None:
+        """Write a frame, less the dropped columns, after those before."""
+
+    def close(self) -> None:  # noqa: B027 a no-op unless there's something to flush
+        pass
+
+
+class CSVWriter(FrameWriter):
+    """UTF-8 CSV with a byte order mark, for spreadsheets."""
+
+    extension = ".csv"
+
+    def __init__(
+        self,
+        path: Path,
+        schema: pa.Schema | None = None,
+        drop: tuple[str, ...] = (),
+    ):
+        super().__init__(path, schema, drop)
+        self._fh = path.open("w", encoding="utf-8-sig", newline="")
+        self._header = True
+
+    def _write(self, df: pd.DataFrame) -> None:
+        df.to_csv(self._fh, index=False, header=self._header)
+        self._header = False
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class ParquetWriter(FrameWriter):
+    """Zstd-compressed Parquet, a row group per write."""
+
+    extension = ".parquet"
+    typed = True
+
+    def __init__(
+        self,
+        path: Path,
+        schema: pa.Schema | None = None,
+        drop: tuple[str, ...] = (),
+    ):
+        super().__init__(path, schema, drop)
+        self._writer = None
+
+    def _write(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(
+                self.path, table.schema, compression=COMPRESSION
+            )
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+class FeatherWriter(FrameWriter):
+    """Arrow IPC file (Feather v2), a record batch per write."""
+
+    extension = ".feather"
+    typed = True
+
+    def __init__(
+        self,
+        path: Path,
+        schema: pa.Schema | None = None,
+        drop: tuple[str, ...] = (),
+    ):
+        super().__init__(path, schema, drop)
+        self._writer = None
+
+    def _write(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        if self._writer is None:
+            options = pa.ipc.IpcWriteOptions(compression=COMPRESSION)
+            self._writer = pa.ipc.new_file(self.path, table.schema, options=options)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+WRITERS: dict[str, type[FrameWriter]] = {
+    "csv": CSVWriter,
+    "parquet": ParquetWriter,
+    "feather": FeatherWriter,
+}
+
+
+def open_writer(
+    path: Path,
+    fmt: str | None = None,
+    schema: pa.Schema | None = None,
+    drop: tuple[str, ...] = (),
+) -> FrameWriter:
+    """Return a writer for path in `fmt` (or as implied by its extension)."""
+    writer = WRITERS[format_of(path, fmt)](path, schema, drop)
+    log.info(f"writing {path} with {type(writer).__name__}")
+    return writer
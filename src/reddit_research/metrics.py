@@ -0,0 +1,216 @@
+"""Counters and latency histograms of web fetches, per host and function.
+
+`web_utils.get_JSON`, `get_HTML`, and `fetch` record each request's
+cache hit or miss, bytes, status codes, and where its time went:
+looking in the response store, sleeping for the rate limiter, waiting
+to retry, on the network, and parsing. Totals answer whether a slow
+run is rate-limit bound or network bound; each request can also be
+written as a JSON line for closer study.
+"""
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2020-2023 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "1.0"
+
+import bisect
+import contextlib as cl
+import json
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TextIO
+from urllib.parse import urlsplit
+
+# where a request's time goes, in the order reported
+PHASES = ("store", "rate_wait", "retry_wait", "network", "parse")
+BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+class Histogram:
+    """Counts of durations in fixed, roughly logarithmic, millisecond buckets."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS_MS) + 1)  # the last is unbounded
+        self.count = 0
+        self.total = 0.0  # seconds
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BOUNDS_MS, seconds * 1000)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Return the upper bound (in ms) of the bucket holding quantile q.
+
+        >>> h = Histogram()
+        >>> for ms in (3, 4, 40, 400): h.observe(ms / 1000)
+        >>> h.quantile(0.5), h.quantile(0.95)
+        (5, 500)
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(
+            (*BOUNDS_MS, self.max * 1000), self.counts, strict=True
+        ):
+            seen += count
+            if seen >= rank and count:
+                return bound
+        return 0
+
+
+@dataclass
+class RequestRecord:
+    """What happened in one call of a fetching function."""
+
+    func: str
+    url: str
+    cache: str = ""  # "hit", "miss", or "" if not looked up
+    statuses: list[int] = field(default_factory=list)  # one per attempt
+    errors: int = 0  # attempts failing without a response
+    bytes: int = 0
+    phases: dict[str, float] = field(default_factory=dict)  # seconds
+    started: float = field(default_factory=time.time)
+
+    @property
+    def host(self) -> str:
+        return urlsplit(self.url).netloc or self.url
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @cl.contextmanager
+    def timing(self, phase: str) -> Iterator[None]:
+        """Add the time spent in the block to phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+
+class Metrics:
+    """Thread-safe totals of `RequestRecord`s, keyed by (host, function)."""
+
+    def __init__(self, jsonl: Path | None = None):
+        self.jsonl = jsonl  # if set, each request is appended as a JSON line
+        self.counters: Counter[tuple[str, str, str]] = Counter()
+        self.histograms: dict[tuple[str, str, str], Histogram] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._fh: TextIO | None = None
+
+    @cl.contextmanager
+    def request(self, func: str, url: str) -> Iterator[RequestRecord]:
+        """Yield a record of the request, totaled when the block ends.
+
+        Nested calls on a thread (e.g., `fetch` within `get_JSON`) share
+        the outer call's record.
+        """
+        if (record := getattr(self._local, "record", None)) is not None:
+            yield record
+            return
+        record = RequestRecord(func, url)
+        self._local.record = record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self._local.record = None
+            self.add(record, time.perf_counter() - start)
+
+    def add(self, record: RequestRecord, seconds: float) -> None:
+        """Fold a finished request into the totals."""
+        key = (record.host, record.func)
+        with self._lock:
+            self.counters[(*key, "requests")] += 1
+            if record.cache:
+                self.counters[(*key, record.cache)] += 1
+            self.counters[(*key, "bytes")] += record.bytes
+            self.counters[(*key, "errors")] += record.errors
+            for status in record.statuses:
+                self.counters[(*key, str(status))] += 1
+            for phase, phase_seconds in (*record.phases.items(), ("total", seconds)):
+                histogram = self.histograms.setdefault((*key, phase), Histogram())
+                histogram.observe(phase_seconds)
+            if self.jsonl is not None:
+                self._write(record, seconds)
+
+    def _write(self, record: RequestRecord, seconds: float) -> None:
+        if self._fh is None:
+            self.jsonl.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = self.jsonl.open("a", encoding="utf-8")
+        line = {
+            "time": round(record.started, 3),
+            "func": record.func,
+            "host": record.host,
+            "url": record.url,
+            "cache": record.cache,
+            "statuses": record.statuses,
+            "errors": record.errors,
+            "bytes": record.bytes,
+            "seconds": round(seconds, 4),
+            **{phase: round(s, 4) for phase, s in record.phases.items()},
+        }
+        self._fh.write(json.dumps(line) + "\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def summary(self) -> str:
+        """Return a table of totals per host and function, and time shares."""
+        with self._lock:
+            keys = sorted({key[:2] for key in self.counters})
+            if not keys:
+                return "no requests recorded"
+            lines = [
+                f"{'host':<24} {'function':<9} {'reqs':>6} {'hit':>6} {'miss':>6}"
+                f" {'MB':>7} {'p50 ms':>7} {'p95 ms':>7}  statuses"
+            ]
+            for host, func in keys:
+                count = {
+                    name: n
+                    for (h, f, name), n in self.counters.items()
+                    if (h, f) == (host, func)
+                }
+                total = self.histograms.get((host, func, "total"), Histogram())
+                statuses = ", ".join(
+                    f"{name}: {n}"
+                    for name, n in sorted(count.items())
+                    if name.isdigit()
+                )
+                lines.append(
+                    f"{host[:24]:<24} {func:<9} {count.get('requests', 0):>6}"
+                    f" {count.get('hit', 0):>6} {count.get('miss', 0):>6}"
+                    f" {count.get('bytes', 0) / 1024**2:>7.1f}"
+                    f" {total.quantile(0.5):>7} {total.quantile(0.95):>7}  {statuses}"
+                )
+            lines.append("")
+            lines.append(f"{'host':<24} seconds in " + ", ".join(PHASES))
+            for host in sorted({host for host, _ in keys}):
+                spent = {
+                    phase: sum(
+                        h.total
+                        for (h_host, _, h_phase), h in self.histograms.items()
+                        if h_host == host and h_phase == phase
+                    )
+                    for phase in PHASES
+                }
+                whole = sum(spent.values()) or 1.0
+                lines.append(
+                    f"{host[:24]:<24} "
+                    + ", ".join(
+                        f"{phase} {s:.1f} ({s / whole:.0%})"
+                        for phase, s in spent.items()
+                    )
+                )
+        return "\n".join(lines)
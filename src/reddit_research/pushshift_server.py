@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""Serve Pushshift's submission search from local dumps, for offline work.
+
+A stand-in for `api.pushshift.io/reddit/submission/search/` that
+answers from JSONL (optionally zstd-compressed) or Parquet dumps of
+submissions. It supports the parameters this package uses: `subreddit`,
+`after`, `before`, `limit`/`size`, `num_comments`, `q`, `sort`,
+`metadata=true`, and `aggs=created_utc&frequency=hour|day`. Latency and
+a per-minute rate limit can be added so pagination, sampling, and
+caching can be benchmarked reproducibly without a network:
+
+    pushshift-server dumps/ --port 8765 --latency 200 --rate 60 &
+    PUSHSHIFT_URL=http://127.0.0.1:8765 reddit-query -a 2022-01-01 ...
+"""
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2020-2023 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "1.0"
+
+import argparse  # http://docs.python.org/dev/library/argparse.html
+import bisect
+import io
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+log = logging.getLogger("pushshift_server")
+
+SEARCH_PATH = "/reddit/submission/search/"
+DEFAULT_LIMIT = 25  # Pushshift's, when neither `limit` nor `size` is given
+MAX_LIMIT = 100
+FREQUENCIES = {"hour": 3600, "day": 86400}
+DUMP_SUFFIXES = (".jsonl", ".jsonl.zst", ".parquet")
+UNLIMITED = 1_000_000  # requests a minute advertised without --rate
+
+
+def parse_comments_num(value: str) -> tuple[str, int]:
+    """Return (operator, count) of a `num_comments` value.
+
+    >>> parse_comments_num(">10")
+    ('>', 10)
+    >>> parse_comments_num("3")
+    ('=', 3)
+    """
+    if value[:1] in {"<", ">"}:
+        return value[0], int(value[1:])
+    return "=", int(value)
+
+
+def matches_comments_num(post: dict, operator: str, count: int) -> bool:
+    """Return whether the post's `num_comments` satisfies the operator and count."""
+    num_comments = post.get("num_comments") or 0
+    if operator == ">":
+        return num_comments > count
+    if operator == "<":
+        return num_comments < count
+    return num_comments == count
+
+
+def read_jsonl(path: Path) -> Iterator[dict]:
+    """Yield records of a JSONL file, decompressing `.zst` as it reads."""
+    if path.suffix == ".zst":
+        import zstandard as zstd
+
+        with path.open("rb") as fh:
+            # dumps are often compressed with a long window
+            reader = zstd.ZstdDecompressor(max_window_size=2**31).stream_reader(fh)
+            for line in io.TextIOWrapper(reader, encoding="utf-8"):
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with path.open(encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_parquet(path: Path) -> Iterator[dict]:
+    """Yield records of a Parquet file, with `created_utc` in epoch seconds."""
+    import pandas as pd
+
+    df = pd.read_parquet(path)
+    if "created_utc" in df and pd.api.types.is_datetime64_any_dtype(df["created_utc"]):
+        df["created_utc"] = df["created_utc"].astype("int64") // 10**9
+    # via JSON so values are plain Python, with NaN as None
+    yield from json.loads(df.to_json(orient="records"))
+
+
+def dump_paths(paths: Iterable[Path]) -> list[Path]:
+    """Return dump files among paths, looking inside directories."""
+    found = []
+    for path in paths:
+        if path.is_dir():
+            found.extend(
+                sorted(p for p in path.iterdir() if p.name.endswith(DUMP_SUFFIXES))
+            )
+        else:
+            found.append(path)
+    return found
+
+
+class DumpIndex:
+    """Submissions per subreddit, sorted by `created_utc` for range queries."""
+
+    def __init__(self):
+        self._posts: dict[str, list[dict]] = {}
+        self._times: dict[str, list[int]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of submissions indexed."""
+        return sum(len(posts) for posts in self._posts.values())
+
+    def add(self, records: Iterable[dict], subreddit: str = "") -> int:
+        """Index records, using `subreddit` for those lacking one; return count."""
+        added = 0
+        touched = set()
+        for record in records:
+            name = (record.get("subreddit") or subreddit).lower()
+            record["created_utc"] = int(float(record["created_utc"]))
+            # fields the API added to what dumps hold
+            if "full_link" not in record and record.get("permalink"):
+                record["full_link"] = f"https://www.reddit.com{record['permalink']}"
+            if "retrieved_on" not in record and "retrieved_utc" in record:
+                record["retrieved_on"] = record["retrieved_utc"]
+            self._posts.setdefault(name, []).append(record)
+            touched.add(name)
+            added += 1
+        for name in touched:
+            posts = self._posts[name]
+            posts.sort(key=lambda post: post["created_utc"])
+            self._times[name] = [post["created_utc"] for post in posts]
+        return added
+
+    def load(self, path: Path) -> int:
+        """Index a dump named like `{subreddit}_submissions.jsonl[.zst]`."""
+        subreddit = path.name.split("_submissions")[0].split(".")[0]
+        records = read_parquet(path) if path.suffix == ".parquet" else read_jsonl(path)
+        added = self.add(records, subreddit)
+        log.info(f"indexed {added:,} submissions from {path}")
+        return added
+
+    def search(
+        self,
+        subreddit: str,
+        after: int | None = None,
+        before: int | None = None,
+        comments_num: str | None = None,
+        q: str | None = None,
+    ) -> list[dict]:
+        """Return posts created after and before (exclusive), oldest first."""
+        name = subreddit.lower()
+        posts, times = self._posts.get(name, []), self._times.get(name, [])
+        start = 0 if after is None else bisect.bisect_right(times, after)
+        stop = len(times) if before is None else bisect.bisect_left(times, before)
+        found = posts[start:stop]
+        if comments_num:
+            operator, count = parse_comments_num(comments_num)
+            found = [p for p in found if matches_comments_num(p, operator, count)]
+        if q:
+            q = q.lower()
+            found = [
+                p
+                for p in found
+                if q in (p.get("title") or "").lower()
+                or q in (p.get("selftext") or "").lower()
+            ]
+        return found
+
+
+def search_response(index: DumpIndex, params: dict[str, str]) -> dict:
+    """Return the JSON body Pushshift would for the query params."""
+    after = int(params["after"]) if params.get("after") else None
+    before = int(params["before"]) if params.get("before") else None
+    found = index.search(
+        params.get("subreddit", ""),
+        after,
+        before,
+        params.get("num_comments"),
+        params.get("q"),
+    )
+    size = params.get("size", params.get("limit"))
+    size = DEFAULT_LIMIT if size is None else min(int(size), MAX_LIMIT)
+    page = found[::-1][:size] if params.get("sort", "asc") == "desc" else found[:size]
+    body: dict = {"data": page}
+    if params.get("metadata") == "true":
+        body["metadata"] = {"total_results": len(found)}
+    if params.get("aggs") == "created_utc":
+        step = FREQUENCIES[params.get("frequency", "day")]
+        buckets: dict[int, int] = {}
+        for post in found:
+            key = post["created_utc"] // step * step
+            buckets[key] = buckets.get(key, 0) + 1
+        body["aggs"] = {
+            "created_utc": [
+                {"key": key, "doc_count": count}
+                for key, count in sorted(buckets.items())
+            ]
+        }
+    return body
+
+
+class RateWindow:
+    """Admit up to `per_minute` requests per fixed one-minute window."""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._lock = threading.Lock()
+        self._window = 0.0
+        self._used = 0
+
+    def admit(self) -> tuple[bool, int, float]:
+        """Return (admitted, requests remaining, seconds until reset)."""
+        with self._lock:
+            now = time.time()
+            if now - self._window >= 60:
+                self._window, self._used = now, 0
+            reset = self._window + 60 - now
+            if self._used >= self.per_minute:
+                return False, 0, reset
+            self._used += 1
+            return True, self.per_minute - self._used, reset
+
+
+class PushshiftServer(ThreadingHTTPServer):
+    """HTTP server answering submission searches from a `DumpIndex`."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        index: DumpIndex,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate: int = 0,
+    ):
+        super().__init__(address, PushshiftHandler)
+        self.index = index
+        self.latency = latency  # seconds added to every response
+        self.jitter = jitter  # seconds, uniformly random, added to latency
+        self.window = RateWindow(rate) if rate else None
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        """Base URL to use as `$PUSHSHIFT_URL`."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> threading.Thread:
+        """Serve from a daemon thread, e.g., within a benchmark."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class PushshiftHandler(BaseHTTPRequestHandler):
+    """Handle GETs of `SEARCH_PATH`; anything else is a 404."""
+
+    server: PushshiftServer
+
+    def do_GET(self) -> None:
+        self.server.requests += 1
+        # when unlimited, say so, so clients' rate limiters don't throttle
+        headers = {"X-Ratelimit-Remaining": str(UNLIMITED), "X-Ratelimit-Reset": "60"}
+        if self.server.window is not None:
+            admitted, remaining, reset = self.server.window.admit()
+            headers = {
+                "X-Ratelimit-Remaining": str(remaining),
+                "X-Ratelimit-Reset": f"{reset:.0f}",
+            }
+            if not admitted:
+                headers["Retry-After"] = f"{reset:.0f}"
+                self.reply(429, {"detail": "Too many requests"}, headers)
+                return
+        if delay := self.server.latency + random.uniform(0, self.server.jitter):
+            time.sleep(delay)
+        parts = urlsplit(self.path)
+        if parts.path.rstrip("/") != SEARCH_PATH.rstrip("/"):
+            self.reply(404, {"detail": "Not Found"}, headers)
+            return
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        try:
+            body = search_response(self.server.index, params)
+        except (KeyError, ValueError) as err:
+            self.reply(400, {"detail": f"bad parameter: {err}"}, headers)
+            return
+        self.reply(200, body, headers)
+
+    def reply(self, status: int, body: dict, headers: dict[str, str]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        log.debug(format % args)
+
+
+def process_args(argv) -> argparse.Namespace:
+    """Process arguments."""
+    arg_parser = argparse.ArgumentParser(
+        description="Serve Pushshift submission search from local dumps."
+    )
+    arg_parser.add_argument(
+        "dumps",
+        type=Path,
+        nargs="+",
+        help="dump files, or directories of them, named like"
+        + " SUBREDDIT_submissions.jsonl[.zst] or .parquet",
+    )
+    arg_parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="address to listen on (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        default=8765,
+        help="port to listen on (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        metavar="MS",
+        help="milliseconds added to each response (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        metavar="MS",
+        help="up to MS more milliseconds, at random (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--rate",
+        type=int,
+        default=0,
+        metavar="N",
+        help="answer N requests a minute, then 429 (default: unlimited)",
+    )
+    arg_parser.add_argument(
+        "-V",
+        "--verbose",
+        action="count",
+        default=0,
+        help="increase verbosity from critical though error, warning, info, and debug",
+    )
+    arg_parser.add_argument("--version", action="version", version="0.1")
+    args = arg_parser.parse_args(argv)
+    log_level = (logging.CRITICAL) - (args.verbose * 10)
+    logging.basicConfig(
+        level=log_level, format="%(levelname).4s %(funcName).10s| %(message)s"
+    )
+    return args
+
+
+def main() -> None:
+    """Index the dumps and serve until interrupted."""
+    args = process_args(sys.argv[1:])
+    index = DumpIndex()
+    for path in dump_paths(args.dumps):
+        if "_comments" not in path.name:  # as kept alongside for reddit-server
+            index.load(path)
+    server = PushshiftServer(
+        (args.host, args.port),
+        index,
+        args.latency / 1000,
+        args.jitter / 1000,
+        args.rate,
+    )
+    print(f"serving {len(index):,} submissions; use PUSHSHIFT_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Token-bucket rate limiting shared by everything that fetches.
+
+Each host gets its own bucket. Buckets are shared across threads and,
+if given a `lock_dir`, across processes via a locked state file per host.
+Servers' `X-Ratelimit-*` and `Retry-After` headers adjust the bucket
+so we run at the allowed rate and back off only as long as asked.
+"""
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2020-2023 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "1.0"
+
+import contextlib as cl
+import json
+import logging
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+log = logging.getLogger("rate_limiter")
+
+DEFAULT_INTERVAL = 2.0  # seconds per request until a server says otherwise
+DEFAULT_BACKOFF = 60.0  # seconds to pause on a 429 without `Retry-After`
+MAX_BACKOFF = 900.0  # never pause longer than this on a single signal
+
+
+@dataclass
+class BucketState:
+    """Mutable state of one host's token bucket."""
+
+    rate: float  # tokens per second
+    capacity: float  # maximum burst
+    tokens: float
+    updated: float  # time.time() of last refill
+    blocked_until: float = 0.0  # no requests before this time.time()
+
+
+def parse_retry_after(value: str | None, now: float | None = None) -> float | None:
+    """Return seconds to wait from a `Retry-After` value (seconds or HTTP-date).
+
+    >>> parse_retry_after("120")
+    120.0
+    >>> parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412470.0)
+    10.0
+    >>> parse_retry_after("soon") is None
+    True
+    """
+    if not value:
+        return None
+    with cl.suppress(ValueError):
+        return max(0.0, float(value))
+    import email.utils  # only needed for the rare HTTP-date form
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, when.timestamp() - now)
+
+
+class TokenBucket:
+    """A token bucket whose state lives in memory or in a locked file."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1.0,
+        state_fn: Path | None = None,
+    ):
+        self._lock = threading.Lock()
+        self._state_fn = state_fn
+        self._default = BucketState(rate, capacity, capacity, time.time())
+        self._memory = BucketState(**asdict(self._default))
+
+    @cl.contextmanager
+    def _state(self) -> Iterator[BucketState]:
+        """Yield the state under lock, persisting it for other processes."""
+        with self._lock:
+            if self._state_fn is None:
+                yield self._memory
+                return
+            import fcntl  # Unix only, and only needed when sharing
+
+            self._state_fn.parent.mkdir(parents=True, exist_ok=True)
+            with self._state_fn.open("a+") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    fh.seek(0)
+                    try:
+                        state = BucketState(**json.loads(fh.read()))
+                    except (ValueError, TypeError):
+                        state = BucketState(**asdict(self._default))
+                    yield state
+                    fh.seek(0)
+                    fh.truncate()
+                    fh.write(json.dumps(asdict(state)))
+                    fh.flush()
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def acquire(self) -> float:
+        """Block until a token is available; return seconds slept."""
+        slept = 0.0
+        while True:
+            with self._state() as state:
+                now = time.time()
+                if now > state.updated:
+                    refill = (now - state.updated) * state.rate
+                    state.tokens = min(state.capacity, state.tokens + refill)
+                    state.updated = now
+                if state.blocked_until > now:
+                    wait = state.blocked_until - now
+                elif state.tokens >= 1:
+                    state.tokens -= 1
+                    return slept
+                else:
+                    wait = (1 - state.tokens) / state.rate
+            time.sleep(wait)
+            slept += wait
+
+    def pause(self, seconds: float) -> None:
+        """Admit no requests for `seconds`, e.g., when told to back off."""
+        seconds = min(seconds, MAX_BACKOFF)
+        with self._state() as state:
+            state.blocked_until = max(state.blocked_until, time.time() + seconds)
+            state.tokens = min(state.tokens, 1.0)  # no burst after the pause
+
+    def set_rate(self, rate: float, capacity: float | None = None) -> None:
+        """Change the refill rate (and optionally the burst capacity)."""
+        with self._state() as state:
+            state.rate = rate
+            if capacity is not None:
+                state.capacity = capacity
+                state.tokens = min(state.tokens, capacity)
+
+
+class RateLimiter:
+    """Per-host token buckets for all HTTP fetches."""
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_INTERVAL,
+        lock_dir: Path | None = None,
+    ):
+        self.interval = interval
+        self.lock_dir = lock_dir
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        """Return the bucket for the host of `url`, creating it if needed."""
+        host = urlsplit(url).netloc or url
+        with self._lock:
+            if host not in self._buckets:
+                state_fn = self.lock_dir / f"{host}.json" if self.lock_dir else None
+                self._buckets[host] = TokenBucket(1 / self.interval, 1.0, state_fn)
+            return self._buckets[host]
+
+    def configure(self, url: str, interval: float, capacity: float = 1.0) -> None:
+        """Set seconds per request (and burst) for the host of `url`."""
+        self.bucket(url).set_rate(1 / interval, capacity)
+
+    def acquire(self, url: str) -> float:
+        """Wait for permission to fetch `url`; return seconds slept."""
+        slept = self.bucket(url).acquire()
+        if slept:
+            log.info(f"rate limited {slept:.2f}s for {urlsplit(url).netloc}")
+        return slept
+
+    def update(self, url: str, headers: dict, status: int) -> float:
+        """Adjust the host's bucket from a response; return any pause imposed.
+
+        Honors `Retry-After` (on 429/503) and Reddit-style
+        `X-Ratelimit-Remaining` and `X-Ratelimit-Reset` headers.
+        """
+        bucket = self.bucket(url)
+        pause = 0.0
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        if status in {429, 503}:
+            pause = retry_after if retry_after is not None else DEFAULT_BACKOFF
+        remaining = headers.get("X-Ratelimit-Remaining")
+        reset = headers.get("X-Ratelimit-Reset")
+        if remaining is not None and reset is not None:
+            with cl.suppress(ValueError):
+                remaining_f, reset_f = float(remaining), float(reset)
+                if remaining_f < 1:
+                    pause = max(pause, reset_f)
+                elif reset_f > 0:
+                    # spread what's left evenly over the rest of the window
+                    bucket.set_rate(remaining_f / reset_f)
+        if pause:
+            log.warning(f"{status=}: pausing {urlsplit(url).netloc} {pause:.0f}s")
+            bucket.pause(pause)
+        return pause
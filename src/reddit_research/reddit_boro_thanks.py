@@ -11,19 +11,22 @@ Remove lines containing 'u/' to filter BORU compiler thanks to other BORU member
 ~95% precision against manual review.
 """
 
+from __future__ import annotations
+
 import argparse
 import re
 import textwrap
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import pandas as pd
-from tqdm import tqdm
+if TYPE_CHECKING:
+    import pandas as pd
 
 PARQUET_FILES = [
     "BestofRedditorUpdates_submissions.parquet",
     "BORUpdates_submissions.parquet",
 ]
-CUTOFF = pd.Timestamp("2025-12-31", tz="UTC")
+CUTOFF = "2025-12-31"  # UTC
 THANK_PATTERN = re.compile(r"\bthank", re.IGNORECASE)
 EXCLUDE_PATTERN = re.compile(
     r"\b(?:thanked|thanking|thankful|thankfully|thanksgiving"
@@ -44,14 +47,18 @@ def _strip_excluded(text: str) -> str:
 
 def load_submissions(data_dir: Path) -> pd.DataFrame:
     """Load and concatenate parquet files."""
+    import pandas as pd
+
     frames = [pd.read_parquet(data_dir / f) for f in PARQUET_FILES]
     return pd.concat(frames, ignore_index=True)
 
 
 def filter_extant(df: pd.DataFrame) -> pd.DataFrame:
     """Keep non-deleted, non-removed submissions up to cutoff."""
+    import pandas as pd
+
     df["created_utc"] = pd.to_datetime(df["created_utc"], unit="s", utc=True)
-    df = df[df["created_utc"] <= CUTOFF].copy()
+    df = df[df["created_utc"] <= pd.Timestamp(CUTOFF, tz="UTC")].copy()
     removed = {"[deleted]", "[removed]"}
     mask = (
         ~df["selftext"].isin(removed)
@@ -148,6 +155,10 @@ def process_args(argv: list[str] | None = None) -> argparse.Namespace:
 
 def main(argv: list[str] | None = None) -> None:
     args = process_args(argv)
+
+    # Heavy imports wait until past argparse, so `--help` is quick
+    from tqdm import tqdm
+
     df = load_submissions(args.data_dir)
     extant = filter_extant(df)
 
@@ -10,9 +10,6 @@ import json
 import re
 from pathlib import Path
 
-import pandas as pd
-from tqdm import tqdm
-
 PATTERN = re.compile(r"(I|My) ?[(\[](\d\d)([FM])[)\]]", re.IGNORECASE)
 SUBREDDITS = [
     "AmItheAsshole",
@@ -71,6 +68,9 @@ def process_subreddit(
     verbose: bool = False,
 ) -> dict | None:
     """Process a single subreddit's parquet file."""
+    import pandas as pd
+    from tqdm import tqdm
+
     sub_name = parquet_path.stem.replace("_submissions", "")
 
     if verbose:
@@ -200,6 +200,10 @@ def main(argv: list[str] | None = None) -> None:
     """Generate demographic statistics table."""
     args = process_args(argv)
 
+    # Heavy imports wait until past argparse, so `--help` is quick
+    import pandas as pd
+    from tqdm import tqdm
+
     # Set up cache directory
     cache_dir = args.cache_dir or (args.data_dir / ".demographics_cache")
     if not args.no_cache:
@@ -9,9 +9,6 @@ import argparse
 import re
 from pathlib import Path
 
-import pandas as pd
-from tqdm import tqdm
-
 PATTERN = re.compile(r"(I|My) ?[(\[](\d\d)([FM])[)\]]", re.IGNORECASE)
 SUBREDDITS = [
     "relationship_advice",
@@ -67,6 +64,9 @@ def process_subreddit(
     parquet_path: Path, start_year: int, end_year: int, verbose: bool = False
 ) -> dict | None:
     """Process a single subreddit's parquet file."""
+    import pandas as pd
+    from tqdm import tqdm
+
     sub_name = parquet_path.stem.replace("_submissions", "")
 
     if verbose:
@@ -169,6 +169,10 @@ def main(argv: list[str] | None = None) -> None:
     """Generate demographic statistics table."""
     args = process_args(argv)
 
+    # Heavy imports wait until past argparse, so `--help` is quick
+    import pandas as pd
+    from tqdm import tqdm
+
     if args.verbose:
         print(
             f"Processing {len(args.subreddits)} subreddits for {args.start_year}--{args.end_year}"
@@ -7,43 +7,43 @@ for submissions' deletion status of author and message, at time of Pushshift's i
 question: What proportion of people on a subreddit delete their posts?
 """
 
+from __future__ import annotations
+
 __author__ = "Joseph Reagle"
 __copyright__ = "Copyright (C) 2009-2023 Joseph Reagle"
 __license__ = "GLPv3"
 __version__ = "1.0"
 
 import argparse  # http://docs.python.org/dev/library/argparse.html
-import collections
+import concurrent.futures
+import datetime as dt
 import logging as log
 import pathlib as pl
-import shelve
 import sys
+import threading
 import typing as typ
+from collections.abc import Iterable, Iterator
 
-import pandas as pd
-import pendulum  # https://pendulum.eustace.io/docs/
-import praw  # type: ignore # https://praw.readthedocs.io/en/latest
-import tqdm  # progress bar https://github.com/tqdm/tqdm
-
+from reddit_research import frame_writers as fw
 from reddit_research import reddit_sample as rs
 from reddit_research import web_utils
+from reddit_research.submission_store import SubmissionRecord, SubmissionStore
+
+pa = web_utils.lazy_import("pyarrow")
+pd = web_utils.lazy_import("pandas")
+pendulum = web_utils.lazy_import("pendulum")  # https://pendulum.eustace.io/docs/
+tqdm = web_utils.lazy_import("tqdm")  # progress bar https://github.com/tqdm/tqdm
 
 # https://github.com/pushshift/api
 # import psaw  # Pushshift API https://github.com/dmarx/psaw no exclude:not
 
-NOW = pendulum.now("UTC")
-NOW_STR = NOW.format("YYYYMMDD")
+NOW = dt.datetime.now(dt.UTC)
+NOW_STR = NOW.strftime("%Y%m%d")
 PUSHSHIFT_LIMIT = 100
 REDDIT_LIMIT = 100
-
-REDDIT = praw.Reddit(
-    user_agent=web_utils.get_credential("REDDIT_USER_AGENT"),
-    client_id=web_utils.get_credential("REDDIT_CLIENT_ID"),
-    client_secret=web_utils.get_credential("REDDIT_CLIENT_SECRET"),
-    username=web_utils.get_credential("REDDIT_USERNAME"),
-    password=web_utils.get_credential("REDDIT_PASSWORD"),
-    ratelimit_seconds=600,
-)
+PREFETCH_FN = pl.Path("prefetch-reddit.sqlite")
+REDDIT_LOCK = threading.Lock()
+STREAM_BATCH = 10_000  # results enriched and written at a time with --stream
 
 
 # This is duplicated in reddit-query.py and reddit-message.py
@@ -54,70 +54,110 @@ def is_throwaway(user_name: str) -> bool:
     return ("throw" in name and "away" in name) or ("throwra" in name)
 
 
-def prefetch_reddit_posts(ids_req: list[str]) -> shelve.Shelf[typ.Any]:
-    """Use praw's info() method to pre-fetch and cache Reddit info."""
-    # TODO if key already in shelf continue, otherwise grab
-    # Break up into 100s
-    shelf = shelve.open("shelf-reddit.dbm")
-    ids_shelved = set(shelf.keys())
-    ids_needed = set(ids_req) - ids_shelved
-    t3_ids = [i if i.startswith("t3_") else f"t3_{i}" for i in ids_needed]
-    submissions = REDDIT.info(fullnames=t3_ids)
-    print("pre-fetch: storing in shelf")
-    for submission in tqdm.tqdm(submissions, total=len(t3_ids)):
-        # print(f"{count: <3} {submission.id} {submission.title}")
-        shelf[submission.id] = submission
-    return shelf
+def prefetch_reddit_posts(
+    ids_req: list[str], max_age: float | None = None
+) -> dict[str, SubmissionRecord]:
+    """Use praw's info() method to pre-fetch and store compact Reddit records.
+
+    Ids are fetched in batches of REDDIT_LIMIT, each committed as it
+    completes, so an interrupted run resumes where it left off: ids
+    already stored (within `max_age` seconds, if given) are not refetched.
+    """
+    store = SubmissionStore(PREFETCH_FN)
+    try:
+        ids_needed = sorted(set(ids_req) - store.fresh_ids(max_age))
+        if ids_stored := len(set(ids_req)) - len(ids_needed):
+            print(f"pre-fetch: {ids_stored} already in {PREFETCH_FN}")
+        print(f"pre-fetch: storing {len(ids_needed)} in {PREFETCH_FN}")
+        with tqdm.tqdm(total=len(ids_needed)) as progress:
+            for start in range(0, len(ids_needed), REDDIT_LIMIT):
+                batch = ids_needed[start : start + REDDIT_LIMIT]
+                t3_ids = [i if i.startswith("t3_") else f"t3_{i}" for i in batch]
+                with REDDIT_LOCK:  # PRAW isn't thread-safe; see --jobs
+                    records = [
+                        SubmissionRecord.from_submission(submission)
+                        for submission in web_utils.get_reddit().info(fullnames=t3_ids)
+                    ]
+                returned = {record.id for record in records}
+                store.put_batch(records, [i for i in batch if i not in returned])
+                progress.update(len(batch))
+        return store.get_many(ids_req)
+    finally:
+        store.close()
 
 
 def get_reddit_info(
     args: argparse.Namespace,
-    shelf: shelve.Shelf[typ.Any],
-    id_: str,
-    author_pushshift: str,
-) -> tuple[str, bool, bool]:
-    """Given id, returns info from reddit."""
-    author_reddit = "NA"
-    is_deleted = False
-    is_removed = False
+    records: dict[str, SubmissionRecord],
+    ids: pd.Series,
+    authors_pushshift: pd.Series,
+) -> tuple[pd.Series, pd.Series, pd.Series]:
+    """Given ids, return Reddit's author, is_deleted, and is_removed columns."""
     if args.skip:
-        log.debug(f"reddit skipped because args.skip {author_pushshift=}")
-    elif args.throwaway_only and not is_throwaway(author_pushshift):
-        log.debug(
-            "reddit skipped because args.throwaway_only but not throwaway "
-            + f"{author_pushshift=}"
-        )
+        log.debug("reddit skipped because args.skip")
+        wanted = pd.Series(False, index=ids.index)
+    elif args.throwaway_only:
+        log.debug("reddit skipped because args.throwaway_only but not throwaway")
+        wanted = authors_pushshift.map(is_throwaway).astype(bool)
     else:
-        author_reddit = "[deleted]"
-
-        # submission = REDDIT.submission(id=id_)
-        if id_ in shelf:
-            submission = shelf[id_]
-        else:
-            # These instances are very rare 0.001%
-            # https://www.reddit.com/r/pushshift/comments/vby7c2/rare_pushshift_has_a_submission_id_reddit_returns/icbbtkr/?context=3
-            print(f"WARNING: {id_=} not in shelf")
-            return "[deleted]", False, False
-        author_reddit = "[deleted]" if not submission.author else submission.author
-        log.debug(f"reddit found {author_pushshift=}")
-        log.debug(f"{submission=}")
-        # https://www.reddit.com/r/pushshift/comments/v6vrmo/was_this_message_removed_or_deleted/
-        is_removed = submission.selftext == "[removed]"
-        if (
-            submission.selftext == "[deleted]"
-            or submission.title == "[deleted by user]"
-        ):
-            is_deleted = True
-        # when removed and then deleted, set deleted as well
-        if submission.removed_by_category == "deleted":
-            is_deleted = True
+        wanted = pd.Series(True, index=ids.index)
 
+    reddit = pd.DataFrame.from_records(
+        [
+            (r.id, r.author, r.title, r.selftext, r.removed_by_category)
+            for r in records.values()
+        ],
+        columns=["id", "author", "title", "selftext", "removed_by_category"],
+    ).set_index("id")
+    found = reddit.reindex(ids.to_numpy()).set_index(ids.index)
+    for id_ in ids[wanted & ~ids.isin(reddit.index)]:
+        # These instances are very rare 0.001%
+        # https://www.reddit.com/r/pushshift/comments/vby7c2/rare_pushshift_has_a_submission_id_reddit_returns/icbbtkr/?context=3
+        print(f"WARNING: {id_=} not in {PREFETCH_FN}")
+
+    author_reddit = found["author"].where(found["author"].notna(), "[deleted]")
+    author_reddit = author_reddit.where(wanted, "NA")
+    # https://www.reddit.com/r/pushshift/comments/v6vrmo/was_this_message_removed_or_deleted/
+    is_removed = wanted & (found["selftext"] == "[removed]")
+    is_deleted = wanted & (
+        (found["selftext"] == "[deleted]")
+        | (found["title"] == "[deleted by user]")
+        # when removed and then deleted, set deleted as well
+        | (found["removed_by_category"] == "deleted")
+    )
     return author_reddit, is_deleted, is_removed
 
 
-def construct_df(args, pushshift_total: int, pushshift_results: list[dict]) -> typ.Any:
+COLUMNS = [
+    "subreddit",
+    "total_p",
+    "author_r",
+    "author_p",
+    "del_author_p",  # on pushshift
+    "del_author_r",  # on reddit
+    "id",
+    "title",
+    "created_utc",
+    "elapsed_hours",
+    "score_p",
+    "comments_num_p",
+    "del_text_p",
+    "del_text_r",
+    "rem_text_r",
+    "crosspost",
+    "url",
+    # "url_api_p",
+    # "url_api_r",
+]
+
+
+def construct_df(
+    args, pushshift_total: int, pushshift_results: list[dict]
+) -> pd.DataFrame:
     """Given pushshift query results, return dataframe of info about submissions.
 
+    Columns are computed in bulk rather than row by row.
+
     https://github.com/pushshift/api
     https://github.com/dmarx/psaw
 
@@ -130,72 +170,44 @@ def construct_df(args, pushshift_total: int, pushshift_results: list[dict]) -> t
     # )
     # REDDIT_API_URL = "https://api.reddit.com/api/info/?id=t3_"
 
-    results_row = []
-    ids_counter = collections.Counter()
-
     ids_all = [message["id"] for message in pushshift_results]
-    shelf = prefetch_reddit_posts(ids_all)
-    for pr in tqdm.tqdm(pushshift_results, total=len(ids_all)):
-        log.debug(f"{pr['id']=} {pr['author']=} {pr['title']=}\n")
-        ids_counter[pr["id"]] += 1
-        created_utc = pendulum.from_timestamp(pr["created_utc"]).format(
-            "YYYYMMDD HH:mm:ss"
-        )
-        elapsed_hours = round((pr["retrieved_on"] - pr["created_utc"]) / 3600)
-        author_r, is_deleted_r, is_removed_r = get_reddit_info(
-            args, shelf, pr["id"], pr["author"]
-        )
-        results_row.append(
-            (  # comments correspond to headings in dataframe below
-                pr["subreddit"],
-                pushshift_total,  # total_p: total range if sampling
-                author_r,  # author_r(eddit)
-                pr["author"],  # author_p(ushshift)
-                pr["author"] == "[deleted]",  # del_author_p(ushshift)
-                author_r == "[deleted]",  # del_author_r(eddit)
-                pr["id"],  # id (pushshift)
-                pr["title"],  # title (pushshift)
-                created_utc,
-                elapsed_hours,  # elapsed hours when pushshift indexed
-                pr["score"],  # at time of ingest
-                pr["num_comments"],  # updated as comments ingested
-                pr.get("selftext", "") == "[deleted]",  # del_text_p(ushshift)
-                is_deleted_r,  # del_text_r(eddit)
-                is_removed_r,  # rem_text_r(eddit)
-                # the following using
-                pr["full_link"] != pr.get("url"),  # crosspost
-                pr["full_link"],  # url
-                # PUSHSHIFT_API_URL + r["id"],
-                # REDDIT_API_URL + r["id"],
-            )
-        )
-    log.debug(results_row)
-
-    COLUMNS = (
-        [
-            "subreddit",
-            "total_p",
-            "author_r",
-            "author_p",
-            "del_author_p",  # on pushshift
-            "del_author_r",  # on reddit
-            "id",
-            "title",
-            "created_utc",
-            "elapsed_hours",
-            "score_p",
-            "comments_num_p",
-            "del_text_p",
-            "del_text_r",
-            "rem_text_r",
-            "crosspost",
-            "url",
-            # "url_api_p",
-            # "url_api_r",
-        ],
+    max_age = None if args.max_age is None else args.max_age * 24 * 3600
+    records = prefetch_reddit_posts(ids_all, max_age)
+    if not pushshift_results:
+        return pd.DataFrame([], columns=pd.Index(COLUMNS))
+    ps = pd.DataFrame.from_records(pushshift_results)
+    missing = pd.Series(None, index=ps.index, dtype=object)
+    author_r, is_deleted_r, is_removed_r = get_reddit_info(
+        args, records, ps["id"], ps["author"]
+    )
+    posts_df = pd.DataFrame(
+        {  # comments correspond to headings above
+            "subreddit": ps["subreddit"],
+            "total_p": pushshift_total,  # total range if sampling
+            "author_r": author_r,  # author_r(eddit)
+            "author_p": ps["author"],  # author_p(ushshift)
+            "del_author_p": ps["author"] == "[deleted]",
+            "del_author_r": author_r == "[deleted]",
+            "id": ps["id"],  # id (pushshift)
+            "title": ps["title"],  # title (pushshift)
+            "created_utc": pd.to_datetime(
+                ps["created_utc"], unit="s", utc=True
+            ).dt.strftime("%Y%m%d %H:%M:%S"),
+            # elapsed hours when pushshift indexed
+            "elapsed_hours": ((ps["retrieved_on"] - ps["created_utc"]) / 3600)
+            .round()
+            .astype(int),
+            "score_p": ps["score"],  # at time of ingest
+            "comments_num_p": ps["num_comments"],  # updated as comments ingested
+            "del_text_p": ps.get("selftext", missing) == "[deleted]",
+            "del_text_r": is_deleted_r,
+            "rem_text_r": is_removed_r,
+            "crosspost": ps["full_link"] != ps.get("url", missing),
+            "url": ps["full_link"],
+        },
+        columns=pd.Index(COLUMNS),
     )
-    posts_df = pd.DataFrame(results_row, columns=pd.Index(COLUMNS))
-    ids_repeating = [m_id for m_id, count in ids_counter.items() if count > 1]
+    ids_repeating = ps.loc[ps["id"].duplicated(keep=False), "id"].unique().tolist()
     if ids_repeating:
         print(f"WARNING: repeat IDs = {ids_repeating=}")
     return posts_df
@@ -240,7 +252,7 @@ def query_pushshift(
     # optional_params += f"&selftext:not=[removed]"
 
     pushshift_url = (
-        "https://api.pushshift.io/reddit/submission/search/"
+        web_utils.pushshift_url()
         + f"?{limit_param}subreddit={subreddit}{optional_params}"
     )
     print(f"{pushshift_url=}")
@@ -254,16 +266,51 @@ def query_pushshift(
     return pushshift_data
 
 
-def collect_pushshift_results(
+def query_offsets(
+    offsets: list[pendulum.DateTime],
+    workers: int,
+    limit: int,
+    before: pendulum.DateTime,
+    subreddit: str,
+    *,
+    query: str = "",
+    comments_num: str = ">0",
+) -> Iterator[list[dict]]:
+    """Query pushshift at each (independent) offset concurrently; yield pages.
+
+    Workers share web_utils' rate limiter, so concurrency only fills the
+    allowed rate; pages are yielded in offset order, as if fetched serially.
+    Only a few pages per worker are fetched ahead of the consumer.
+    """
+    web_utils.ensure_pool_size(workers)
+
+    def query_offset(query_iteration: int, after_offset: pendulum.DateTime) -> list:
+        log.info(f"{after_offset=}, {before=}")
+        log.critical(f"{query_iteration}")
+        return query_pushshift(
+            limit, after_offset, before, subreddit, query, comments_num
+        )
+
+    window = workers * 4
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(offsets), window):
+            chunk = offsets[start : start + window]
+            yield from executor.map(
+                query_offset, range(start, start + len(chunk)), chunk
+            )
+
+
+def iter_pushshift_pages(
     args: argparse.Namespace,
     limit: int,
     after: pendulum.DateTime,
     before: pendulum.DateTime,
     subreddit: str,
+    *,
     query: str = "",
     comments_num: str = ">0",
-) -> tuple[int, typ.Any]:
-    """Breakup queries by PUSHSHIFT_LIMIT.
+) -> Iterator[list[dict]]:
+    """Breakup queries by PUSHSHIFT_LIMIT, yielding each page of results.
 
     Pushshift limited to PUSHSHIFT_LIMIT (100) results,
     so need multiple queries to collect results in date range up to
@@ -275,34 +322,63 @@ def collect_pushshift_results(
         # TODO/BUG: comments_num won't work with sampling estimates
         #   because they'll throw off the estimates
 
-        results_total = rs.get_pushshift_total(subreddit, after, before)
-        offsets = rs.get_offsets(subreddit, after, before, limit, PUSHSHIFT_LIMIT)
+        offsets = rs.get_offsets(
+            subreddit, after, before, limit, PUSHSHIFT_LIMIT, sampler=args.sample
+        )
         log.info(f"{offsets=}")
-        results_found = []
-        for query_iteration, after_offset in enumerate(offsets):
-            log.info(f"{after_offset=}, {before=}")
-            log.critical(f"{query_iteration}")
-            results = query_pushshift(
-                limit, after_offset, before, subreddit, query, comments_num
-            )
-            results_found.extend(results)
+        yield from query_offsets(
+            offsets,
+            args.workers,
+            limit,
+            before,
+            subreddit,
+            query=query,
+            comments_num=comments_num,
+        )
 
     else:  # collect only first message starting with after up to limit
         # I need an initial to see if there's anything in results
-        results_total = rs.get_pushshift_total(subreddit, after, before)
         query_iteration = 1
-        results = results_found = query_pushshift(
-            limit, after, before, subreddit, query, comments_num
-        )
-        while len(results) != 0 and len(results_found) < limit:
+        found = 0
+        results = query_pushshift(limit, after, before, subreddit, query, comments_num)
+        while len(results) != 0:
+            yield results[: limit - found]
+            found += len(results)
+            if found >= limit:
+                break
             log.critical(f"{query_iteration=}")
             query_iteration += 1
             after_new = pendulum.from_timestamp(results[-1]["created_utc"])
             results = query_pushshift(
                 limit, after_new, before, subreddit, query, comments_num
             )
-            results_found.extend(results)
-        results_found = results_found[0:limit]
+
+
+def collect_pushshift_results(
+    args: argparse.Namespace,
+    limit: int,
+    after: pendulum.DateTime,
+    before: pendulum.DateTime,
+    subreddit: str,
+    query: str = "",
+    comments_num: str = ">0",
+) -> tuple[int, typ.Any]:
+    """Return pushshift's total in range and all pages of results, in memory."""
+    results_total = rs.get_pushshift_total(subreddit, after, before)
+    results_found = [
+        result
+        for page in iter_pushshift_pages(
+            args,
+            limit,
+            after,
+            before,
+            subreddit,
+            query=query,
+            comments_num=comments_num,
+        )
+        for result in page
+    ]
+    if not args.sample:
         print(f"returning {len(results_found)} (first) posts in range\n")
 
     log.info(f"{results_total=}")
@@ -310,10 +386,98 @@ def collect_pushshift_results(
     return results_total, results_found
 
 
-def export_df(name, df) -> None:
-    """Export dataframe to CSV."""
-    df.to_csv(f"{name}.csv", encoding="utf-8-sig", index=False)
-    print(f"saved dataframe of shape {df.shape} to '{name}.csv'")
+def stream_results(
+    args: argparse.Namespace,
+    writer: fw.FrameWriter,
+    pushshift_total: int,
+    pages: Iterable[list[dict]],
+    batch_size: int = STREAM_BATCH,
+) -> int:
+    """Enrich and write pages as they arrive, batch_size results at a time.
+
+    Only one batch of results (and the ids seen) is held in memory.
+    Returns the number of rows written.
+    """
+    ids_seen: set[str] = set()
+    batch: list[dict] = []
+    for page in pages:
+        batch.extend(page)
+        if len(batch) >= batch_size:
+            write_batch(args, writer, pushshift_total, batch, ids_seen)
+            batch = []
+    if batch or not writer.rows:  # an empty CSV still gets its header
+        write_batch(args, writer, pushshift_total, batch, ids_seen)
+    return writer.rows
+
+
+def write_batch(
+    args: argparse.Namespace,
+    writer: fw.FrameWriter,
+    pushshift_total: int,
+    batch: list[dict],
+    ids_seen: set[str],
+) -> None:
+    """Construct the dataframe of a batch of results and write it."""
+    ids_repeating = [r["id"] for r in batch if r["id"] in ids_seen]
+    if ids_repeating:
+        print(f"WARNING: repeat IDs from earlier batches = {ids_repeating=}")
+    ids_seen.update(r["id"] for r in batch)
+    write_df(writer, construct_df(args, pushshift_total, batch))
+    print(f"wrote {writer.rows} rows to '{writer.path}'")
+
+
+def arrow_schema() -> pa.Schema:
+    """Return the typed schema of construct_df's columns for Parquet/Feather."""
+    string, integer, boolean = pa.string(), pa.int64(), pa.bool_()
+    return pa.schema(
+        [
+            ("subreddit", string),
+            ("total_p", integer),
+            ("author_r", string),
+            ("author_p", string),
+            ("del_author_p", boolean),
+            ("del_author_r", boolean),
+            ("id", string),
+            ("title", string),
+            ("created_utc", pa.timestamp("s", tz="UTC")),
+            ("elapsed_hours", integer),
+            ("score_p", integer),
+            ("comments_num_p", integer),
+            ("del_text_p", boolean),
+            ("del_text_r", boolean),
+            ("rem_text_r", boolean),
+            ("crosspost", boolean),
+            ("url", string),
+        ]
+    )
+
+
+def typed_df(df: pd.DataFrame) -> pd.DataFrame:
+    """Return df with created_utc as a timestamp rather than a string."""
+    return df.assign(
+        created_utc=pd.to_datetime(
+            df["created_utc"], format="%Y%m%d %H:%M:%S", utc=True
+        )
+    )
+
+
+def export_df(
+    path: pl.Path,
+    df: pd.DataFrame,
+    fmt: str | None = None,
+    drop: tuple[str, ...] = (),
+) -> None:
+    """Export dataframe as CSV, Parquet, or Feather per fmt or path's extension."""
+    fmt = fw.format_of(path, fmt)
+    schema = arrow_schema() if fw.WRITERS[fmt].typed else None
+    with fw.open_writer(path, fmt, schema, drop) as writer:
+        write_df(writer, df)
+    print(f"saved dataframe of shape {df.shape} to '{path}'")
+
+
+def write_df(writer: fw.FrameWriter, df: pd.DataFrame) -> None:
+    """Write df, typed if the writer keeps types."""
+    writer.write(typed_df(df) if writer.typed else df)
 
 
 def process_args(argv) -> argparse.Namespace:
@@ -366,15 +530,42 @@ def process_args(argv) -> argparse.Namespace:
         "-r",
         "--subreddit",
         type=str,
-        default="AmItheAsshole",
-        help="subreddit to query (default: %(default)s)",
+        nargs="+",
+        default=[],
+        help="subreddits to query (default: AmItheAsshole)",
+    )
+    arg_parser.add_argument(
+        "--subreddits-file",
+        type=pl.Path,
+        default=None,
+        metavar="FILE",
+        help="also query subreddits listed in FILE, one per line",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=4,
+        help="subreddits queried concurrently (default: %(default)s)",
     )
     arg_parser.add_argument(
         "--sample",
-        action="store_true",
+        nargs="?",
+        const="uniform",
         default=False,
+        choices=rs.SAMPLERS,
         help="""sample complete date range up to limit, rather than """
-        + """first submissions within limit""",
+        + """first submissions within limit; "weighted" samples busy hours"""
+        + """ more, per Pushshift's hourly counts; "quasi" spreads samples"""
+        + """ evenly (low-discrepancy) rather than randomly"""
+        + """ (default: %(const)s)""",
+    )
+    arg_parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=4,
+        help="concurrent Pushshift queries when sampling (default: %(default)s)",
     )
     arg_parser.add_argument(
         "--skip",
@@ -382,6 +573,14 @@ def process_args(argv) -> argparse.Namespace:
         default=False,
         help="skip all Reddit fetches; pushshift only",
     )
+    arg_parser.add_argument(
+        "--max-age",
+        type=float,
+        default=None,
+        metavar="DAYS",
+        help=f"refetch Reddit records in {PREFETCH_FN}, including ids Reddit"
+        + " didn't return, once older than DAYS (default: never)",
+    )
     arg_parser.add_argument(
         "-t",
         "--throwaway-only",
@@ -392,6 +591,45 @@ def process_args(argv) -> argparse.Namespace:
             + """ fetched from Reddit"""
         ),
     )
+    arg_parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=False,
+        help=f"fetch, enrich, and write {STREAM_BATCH:,} results at a time,"
+        + " so memory stays flat on large pulls",
+    )
+    arg_parser.add_argument(
+        "-o",
+        "--output",
+        type=pl.Path,
+        default=None,
+        help="file to write (default: named after the query, with --format's"
+        + " extension)",
+    )
+    arg_parser.add_argument(
+        "--dataset",
+        type=pl.Path,
+        default=None,
+        metavar="DIR",
+        help="write Parquet partitioned by subreddit (DIR/subreddit=NAME/)"
+        + " rather than a file per subreddit in the current directory",
+    )
+    arg_parser.add_argument(
+        "-f",
+        "--format",
+        choices=fw.FORMATS,
+        default=None,
+        help="output format (default: from --output's extension, else csv)",
+    )
+    arg_parser.add_argument(
+        "--metrics",
+        nargs="?",
+        const=True,
+        default=False,
+        metavar="FILE",
+        help="at exit, summarize where fetching time went; with FILE, also"
+        + " write each request to it as a JSON line",
+    )
     arg_parser.add_argument(
         "-L",
         "--log-to-file",
@@ -408,6 +646,12 @@ def process_args(argv) -> argparse.Namespace:
     )
     arg_parser.add_argument("--version", action="version", version="0.4")
     args = arg_parser.parse_args(argv)
+    if args.workers < 1:
+        arg_parser.error(f"--workers must be at least 1, not {args.workers}")
+    if args.max_age is not None and args.max_age < 0:
+        arg_parser.error(f"--max-age must not be negative, not {args.max_age}")
+    if not args.subreddit and not args.subreddits_file:
+        args.subreddit = ["AmItheAsshole"]
 
     log_level = (log.CRITICAL) - (args.verbose * 10)
     LOG_FORMAT = "%(levelname).4s %(funcName).10s:%(lineno)-4d| %(message)s"
@@ -421,27 +665,34 @@ def process_args(argv) -> argparse.Namespace:
         )
     else:
         log.basicConfig(level=log_level, format=LOG_FORMAT)
+    if args.metrics:
+        jsonl = None if args.metrics is True else pl.Path(args.metrics)
+        web_utils.configure_metrics(jsonl=jsonl)
 
     return args
 
 
-def main() -> None:
-    """Set up arguments and call functions."""
-    # syntactical tweaks to filename
-    after = before = date_str = None
-    args = process_args(sys.argv[1:])
-    if args.after and args.before:
-        after: pendulum.DateTime = pendulum.parse(args.after)
-        before: pendulum.DateTime = pendulum.parse(args.before)
-        date_str = f"{after.format('YYYYMMDD')}-{before.format('YYYYMMDD')}"
-    elif args.after:
-        after = pendulum.parse(args.after)
-        date_str = f"{after.format('YYYYMMDD')}-{NOW_STR}"
-    elif args.before:
-        raise ValueError("--before cannot be used without --after")
-    else:
-        raise ValueError("Invalid date range specified")
+def get_subreddits(args: argparse.Namespace) -> list[str]:
+    """Return subreddits from --subreddit and --subreddits-file, in order."""
+    subreddits = list(args.subreddit)
+    if args.subreddits_file:
+        for line in args.subreddits_file.read_text().splitlines():
+            if (name := line.split("#")[0].strip().removeprefix("r/")) != "":
+                subreddits.append(name)
+    return list(dict.fromkeys(subreddits))  # without repeats
 
+
+def result_path(
+    args: argparse.Namespace,
+    subreddit: str,
+    date_str: str,
+    number_results: int,
+    fmt: str,
+) -> pl.Path:
+    """Return the output path, named after the query unless --output is given."""
+    if args.output:
+        return args.output
+    # syntactical tweaks to filename
     if args.comments_num:
         comments_num = args.comments_num
         if comments_num[0] == ">":
@@ -452,24 +703,104 @@ def main() -> None:
     else:
         comments_num = ""
     sample = "_sampled" if args.sample else ""
+    if args.sample and args.sample != "uniform":
+        sample += f"-{args.sample}"
     throwaway = "_throwaway" if args.throwaway_only else ""
+    result_name = (
+        f"""reddit_{date_str}_{subreddit}{comments_num}"""
+        + f"""_l{args.limit}_n{number_results}{sample}{throwaway}"""
+    )
+    directory = args.dataset / f"subreddit={subreddit}" if args.dataset else pl.Path()
+    return directory / (result_name + fw.WRITERS[fmt].extension)
 
+
+def query_subreddit(
+    args: argparse.Namespace,
+    subreddit: str,
+    after: pendulum.DateTime,
+    before: pendulum.DateTime,
+    date_str: str,
+) -> pl.Path:
+    """Query and export one subreddit; return the path written."""
     query = {
         "limit": args.limit,
         "before": before,
         "after": after,
-        "subreddit": args.subreddit,
+        "subreddit": subreddit,
         "comments_num": args.comments_num,
     }
     print(f"{query=}")
+    fmt = (
+        "parquet"
+        if args.dataset
+        else fw.format_of(args.output or pl.Path(), args.format)
+    )
+    # a dataset's directories name the subreddit, so files don't repeat it
+    drop = ("subreddit",) if args.dataset else ()
+
+    if args.stream:
+        # the number of results, part of the name, is only known at the end
+        path = result_path(args, subreddit, date_str, 0, fmt).with_name(
+            f"reddit-query-{subreddit}.partial{fw.WRITERS[fmt].extension}"
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        schema = arrow_schema() if fw.WRITERS[fmt].typed else None
+        ps_total = rs.get_pushshift_total(subreddit, after, before)
+        with fw.open_writer(path, fmt, schema, drop) as writer:
+            pages = iter_pushshift_pages(args, **query)
+            number_results = stream_results(args, writer, ps_total, pages)
+        final_path = result_path(args, subreddit, date_str, number_results, fmt)
+        path.rename(final_path)
+        print(f"saved {number_results} rows to '{final_path}'")
+        return final_path
     ps_total, ps_results = collect_pushshift_results(args, **query)
     posts_df = construct_df(args, ps_total, ps_results)
-    number_results = len(posts_df)
-    result_name = (
-        f"""reddit_{date_str}_{args.subreddit}{comments_num}"""
-        + f"""_l{args.limit}_n{number_results}{sample}{throwaway}"""
-    )
-    export_df(result_name, posts_df)
+    final_path = result_path(args, subreddit, date_str, len(posts_df), fmt)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    export_df(final_path, posts_df, fmt, drop)
+    return final_path
+
+
+def main() -> None:
+    """Set up arguments and call functions."""
+    after = before = date_str = None
+    args = process_args(sys.argv[1:])
+    if args.after and args.before:
+        after: pendulum.DateTime = pendulum.parse(args.after)
+        before: pendulum.DateTime = pendulum.parse(args.before)
+        date_str = f"{after.format('YYYYMMDD')}-{before.format('YYYYMMDD')}"
+    elif args.after:
+        after = pendulum.parse(args.after)
+        date_str = f"{after.format('YYYYMMDD')}-{NOW_STR}"
+    elif args.before:
+        raise ValueError("--before cannot be used without --after")
+    else:
+        raise ValueError("Invalid date range specified")
+
+    subreddits = get_subreddits(args)
+    if args.output and len(subreddits) > 1:
+        raise ValueError("--output names one file; use --dataset for many subreddits")
+    jobs = max(1, min(args.jobs, len(subreddits)))
+    # size the shared pool once, before concurrent subreddits use it
+    web_utils.ensure_pool_size(jobs * (args.workers if args.sample else 1))
+
+    if len(subreddits) == 1:  # errors propagate, with their traceback
+        query_subreddit(args, subreddits[0], after, before, date_str)
+        return
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(query_subreddit, args, sub, after, before, date_str): sub
+            for sub in subreddits
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as err:  # noqa: BLE001 so other subreddits finish
+                log.critical(f"{futures[future]} failed: {err!r}")
+                failed.append(f"{futures[future]} ({err!r})")
+    if failed:
+        sys.exit(f"failed subreddits: {', '.join(failed)}")
 
 
 if __name__ == "__main__":
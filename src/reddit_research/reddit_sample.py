@@ -6,6 +6,8 @@ offsets within the range, including the ability to sample throughout
 the range.
 """
 
+from __future__ import annotations
+
 __author__ = "Joseph Reagle"
 __copyright__ = "Copyright (C) 2009-2023 Joseph Reagle"
 __license__ = "GLPv3"
@@ -14,28 +16,23 @@ __version__ = "1.0"
 import logging
 import math
 import random
+import time
+from collections.abc import Callable
 from pathlib import Path
 
-import cachier
-import numpy as np
-import pendulum  # https://pendulum.eustace.io/docs/
-import praw
-
 # datetime: date, time, datetime, timedelta
 # pendulum: datetime, Duration (timedelta), Period (Duration)
 from reddit_research import web_utils  # https://github.com/reagle/thunderdell
+from reddit_research.count_store import COUNTS_FN, DAY, DayCountStore, missing_runs
 
-REDDIT = praw.Reddit(
-    user_agent=web_utils.get_credential("REDDIT_USER_AGENT"),
-    client_id=web_utils.get_credential("REDDIT_CLIENT_ID"),
-    client_secret=web_utils.get_credential("REDDIT_CLIENT_SECRET"),
-    username=web_utils.get_credential("REDDIT_USERNAME"),
-    password=web_utils.get_credential("REDDIT_PASSWORD"),
-    ratelimit_seconds=600,
-)
-
+np = web_utils.lazy_import("numpy")
+pendulum = web_utils.lazy_import("pendulum")  # https://pendulum.eustace.io/docs/
 
 HOMEDIR = Path.home()
+# how get_offsets spreads offsets: over hours or submissions, randomly or quasi
+SAMPLERS = ("uniform", "weighted", "quasi", "weighted-quasi")
+GOLDEN_FRACTION = (math.sqrt(5) - 1) / 2  # step of the golden ratio sequence
+INGEST_LAG = 2 * DAY  # Pushshift counts of more recent days may still grow
 
 log = logging.getLogger("reddit_sample")
 log.exception = logging.exception
@@ -74,26 +71,20 @@ def is_overlapping(offsets: list, PUSHSHIFT_LIMIT: int, results_per_hour: int) -
     return False
 
 
-@cachier.cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
-def get_pushshift_total(
-    subreddit: str,
-    after: pendulum.DateTime,
-    before: pendulum.DateTime,
-) -> int:
+@web_utils.lazy_cachier(  # stale_after=dt.timedelta(days=7)
+    skip=web_utils.pushshift_stand_in, pickle_reload=False
+)
+def get_range_total(subreddit: str, after_epoch: int, before_epoch: int) -> int:
     """Get the total number of results in a Pushshift query.
 
     Uses the '&metadata=true' parameter.
     """
     log.info("*************")
-    log.info(f"after = {after.format('YYYY-MM-DD HH:mm:ss ZZ')}")
-    after_epoch = int(after.int_timestamp)
     log.info(f"{after_epoch=}")
-    log.info(f"before = {before.format('YYYY-MM-DD HH:mm:ss ZZ')}")
-    before_epoch = int(before.int_timestamp)
     log.info(f"{before_epoch=}")
     PUSHSHIFT_META_URL = (
-        "https://api.pushshift.io/reddit/submission/search/"
-        f"?subreddit={subreddit}&after={after_epoch}&before={before_epoch}"
+        web_utils.pushshift_url()
+        + f"?subreddit={subreddit}&after={after_epoch}&before={before_epoch}"
         "&size=0&metadata=true"
     )
     log.info(f"{PUSHSHIFT_META_URL=}")
@@ -105,6 +96,107 @@ def get_pushshift_total(
     return results_total
 
 
+def get_day_counts(
+    subreddit: str, first: int, last: int, *, cached: bool = True
+) -> dict[int, int]:
+    """Get the number of submissions on each day (since epoch) in [first, last).
+
+    Uses the '&aggs=created_utc&frequency=day' parameters. Counts that
+    may still grow shouldn't be cached in the response store.
+    """
+    PUSHSHIFT_AGGS_URL = (
+        web_utils.pushshift_url()
+        + f"?subreddit={subreddit}&after={first * DAY}&before={last * DAY}"
+        "&aggs=created_utc&frequency=day&size=0"
+    )
+    log.info(f"{PUSHSHIFT_AGGS_URL=}")
+    counts = dict.fromkeys(range(first, last), 0)
+    buckets = web_utils.get_JSON(PUSHSHIFT_AGGS_URL, cached=cached)["aggs"]
+    for bucket in buckets["created_utc"]:
+        if (day := bucket["key"] // DAY) in counts:
+            counts[day] += bucket["doc_count"]
+    return counts
+
+
+def get_pushshift_total(
+    subreddit: str,
+    after: pendulum.DateTime,
+    before: pendulum.DateTime,
+) -> int:
+    """Get the total number of results between after and before.
+
+    Whole (UTC) days are summed from the day count store, which asks
+    Pushshift only for the days it lacks, a run of days per query;
+    partial days at either end are counted directly.
+    """
+    after_epoch = int(after.int_timestamp)
+    before_epoch = int(before.int_timestamp)
+    first = -(-after_epoch // DAY)  # first whole day
+    last = before_epoch // DAY  # day after the last whole day
+    if first >= last:
+        return get_range_total(subreddit, after_epoch, before_epoch)
+
+    # a stand-in's counts are kept only for this call
+    store = DayCountStore(
+        Path(":memory:") if web_utils.pushshift_stand_in() else COUNTS_FN
+    )
+    try:
+        counts = store.get(subreddit, first, last)
+        missing = [day for day in range(first, last) if day not in counts]
+        settled = int((time.time() - INGEST_LAG) // DAY)
+        older = [day for day in missing if day < settled]
+        recent = [day for day in missing if day >= settled]
+        # recent days may still be ingesting, so are fetched afresh, and not kept
+        for days, is_settled in ((older, True), (recent, False)):
+            for run_first, run_last in missing_runs(days):
+                fetched = get_day_counts(
+                    subreddit, run_first, run_last, cached=is_settled
+                )
+                counts.update(fetched)
+                if is_settled:
+                    store.put(subreddit, fetched)
+    finally:
+        store.close()
+    results_total = sum(counts.values())
+    if after_epoch < first * DAY:
+        results_total += get_range_total(subreddit, after_epoch, first * DAY)
+    if last * DAY < before_epoch:
+        results_total += get_range_total(subreddit, last * DAY, before_epoch)
+    log.info(f"{results_total=} with {len(missing)} days fetched")
+    return results_total
+
+
+@web_utils.lazy_cachier(  # stale_after=dt.timedelta(days=7)
+    skip=web_utils.pushshift_stand_in, pickle_reload=False
+)
+def get_hourly_counts(
+    subreddit: str,
+    after: pendulum.DateTime,
+    before: pendulum.DateTime,
+) -> list[int]:
+    """Get the number of submissions in each hour from after to before.
+
+    Uses the '&aggs=created_utc&frequency=hour' parameters.
+    """
+    after_epoch = int(after.int_timestamp)
+    before_epoch = int(before.int_timestamp)
+    PUSHSHIFT_AGGS_URL = (
+        web_utils.pushshift_url()
+        + f"?subreddit={subreddit}&after={after_epoch}&before={before_epoch}"
+        "&aggs=created_utc&frequency=hour&size=0"
+    )
+    log.info(f"{PUSHSHIFT_AGGS_URL=}")
+    buckets = web_utils.get_JSON(PUSHSHIFT_AGGS_URL)["aggs"]["created_utc"]
+    hours = math.ceil((before_epoch - after_epoch) / 3600)
+    counts = [0] * hours
+    for bucket in buckets:
+        # buckets start on the hour, so the first may start before `after`
+        hour = min(max((bucket["key"] - after_epoch) // 3600, 0), hours - 1)
+        counts[hour] += bucket["doc_count"]
+    log.info(f"{sum(counts)=} in {hours=}, at most {max(counts, default=0)}")
+    return counts
+
+
 def get_sequence(size: int, samples: int) -> list[int]:
     """Return [0,size, k=samples).
 
@@ -132,25 +224,127 @@ def get_cacheable_randos(size: int, samples: int, seed: int):
     >>> get_cacheable_randos(50, 10, seed=7)
     [3, 4, 6, 9, 20, 23, 25, 34, 37, 41]
     >>> get_cacheable_randos(50, 15, seed=7)
-    [2, 3, 4, 5, 6, 9, 13, 20, 23, 25, 32, 34, 37, 41, 45].
+    [2, 3, 4, 5, 6, 9, 13, 20, 23, 25, 32, 34, 37, 41, 45]
     """
-    # TODO: Replace with low-discrepancy, quasi-random numbers
-    # (qmc.Sobol.integers() is forthcoming in scipy 1.9)
+    # for low-discrepancy, quasi-random numbers see get_quasi_randos
 
     random.seed(seed)
     return sorted(random.sample(range(size), samples))
 
 
+def count_slots(size: int, samples: int, min_gap: int) -> int:
+    """Return how many offsets min_gap apart fit in size, if enough for samples.
+
+    >>> count_slots(72, 2, min_gap=21)
+    4
+    """
+    slots = -(-size // min_gap)  # offsets 0, min_gap, ... up to size - 1
+    if samples > slots:
+        raise RuntimeError(
+            f"{samples=} offsets at least {min_gap=} apart don't fit in {size=};"
+            " sample less or over a longer range"
+        )
+    return slots
+
+
+def slot_shift(size: int, slots: int, min_gap: int, rng) -> int:
+    """Return a random shift of every slot, within the range's slack."""
+    return int(rng.integers(0, size - 1 - (slots - 1) * min_gap, endpoint=True))
+
+
+def get_spaced_randos(size: int, samples: int, min_gap: int, seed: int) -> list[int]:
+    """Return k=samples of random integers up to `size`, at least `min_gap` apart.
+
+    The range is cut into slots of min_gap, all shifted by the same
+    seeded amount of the range's slack, and a seeded permutation picks
+    the slots, so neighbors are never closer than min_gap. Slots and
+    the shift don't depend on `samples`, so a larger sample result
+    includes smaller ones.
+    >>> get_spaced_randos(100, 5, min_gap=3, seed=7)
+    [12, 30, 36, 51, 96]
+    >>> get_spaced_randos(100, 10, min_gap=3, seed=7)
+    [9, 12, 27, 30, 36, 42, 51, 57, 66, 96]
+    >>> get_spaced_randos(72, 2, min_gap=21, seed=7)
+    [8, 50]
+    """
+    slots = count_slots(size, samples, min_gap)
+    rng = np.random.default_rng(seed)
+    chosen = rng.permutation(slots)[:samples]
+    shift = slot_shift(size, slots, min_gap, rng)
+    return sorted((chosen * min_gap + shift).tolist())
+
+
+def get_quasi_randos(size: int, samples: int, min_gap: int, seed: int) -> list[int]:
+    """Return k=samples of quasi-random integers up to `size`, at least `min_gap` apart.
+
+    Like get_spaced_randos, but slots are taken in the order of a
+    (randomly shifted) golden ratio sequence, which has low discrepancy:
+    any prefix of it covers the range evenly, without random clumps and
+    gaps. A larger sample result includes smaller ones, and memory is
+    proportional to samples rather than size.
+    >>> get_quasi_randos(100, 5, min_gap=3, seed=7)
+    [9, 24, 48, 63, 87]
+    >>> get_quasi_randos(100, 10, min_gap=3, seed=7)
+    [9, 18, 24, 33, 48, 57, 63, 72, 87, 96]
+    """
+    slots = count_slots(size, samples, min_gap)
+    rng = np.random.default_rng(seed)
+    start = rng.random()
+    terms = samples
+    while True:
+        points = np.modf(start + np.arange(terms) * GOLDEN_FRACTION)[0]
+        cells = (points * slots).astype(np.int64)
+        # keep each slot's first appearance, in sequence order
+        _, first = np.unique(cells, return_index=True)
+        if len(first) >= samples:
+            break
+        terms *= 2
+    chosen = cells[np.sort(first)[:samples]]
+    shift = slot_shift(size, slots, min_gap, rng)
+    return sorted((chosen * min_gap + shift).tolist())
+
+
+def get_weighted_randos(
+    counts: list[int],
+    samples: int,
+    min_volume: int,
+    seed: int,
+    spacer: Callable[[int, int, int, int], list[int]] = get_spaced_randos,
+) -> list[int]:
+    """Return k=samples of hours (indexes of counts), drawn in proportion to counts.
+
+    Submissions are numbered in time order and offsets are spaced among
+    those numbers by `spacer`, so busy hours get more offsets.
+    Spacing by min_volume plus the busiest hour's count ensures the
+    min_volume submissions fetched at one offset's hour end before the
+    next offset's hour begins. Larger samples include smaller ones.
+    >>> counts = [5, 0, 40, 10, 0, 60, 20, 0, 30, 15, 0, 50, 25, 5, 0, 35, 10, 45]
+    >>> get_weighted_randos(counts, 1, min_volume=20, seed=7)
+    [9]
+    >>> get_weighted_randos(counts, 2, min_volume=20, seed=7)
+    [2, 9]
+    """
+    cumulative = np.cumsum(counts)
+    gap = min_volume + int(max(counts))
+    positions = spacer(int(cumulative[-1]) - min_volume + 1, samples, gap, seed)
+    return np.searchsorted(cumulative, positions, side="right").tolist()
+
+
 def get_offsets(
     subreddit: str,
     after: pendulum.DateTime,
     before: pendulum.DateTime,
     sample_size: int,
     PUSHSHIFT_LIMIT: int,
+    *,
+    sampler: str = "uniform",
 ) -> list[pendulum.DateTime]:
     """For sampling, return a set of hourly offsets.
 
-    Begins near after that should not overlap.
+    Begins near after that should not overlap. A "uniform" sampler spreads
+    offsets evenly over hours assuming an average rate; a "weighted" sampler
+    spreads them in proportion to each hour's actual volume. Either is
+    random, or with "quasi", low-discrepancy (see get_quasi_randos).
     """
     duration = before - after
     log.info(f"{duration.in_days()=}")
@@ -166,23 +360,19 @@ def get_offsets(
     log.info(f"{queries_total=}")
     log.info(f"{range(duration.in_hours())=}")
 
-    SEEDS_TO_TRY = 300
+    if sampler not in SAMPLERS:
+        raise ValueError(f"unknown {sampler=}; expected one of {SAMPLERS}")
     seed = int(after.timestamp())
-    for seed_counter in range(SEEDS_TO_TRY):
-        seed += seed_counter  # increment seed
-        log.warning(f"attempt {seed_counter} to find non-overlapping offsets")
-        offsets = get_cacheable_randos(duration.in_hours(), queries_total, seed)
-        if is_overlapping(offsets, PUSHSHIFT_LIMIT, results_per_hour):
-            log.critical(f"  seed attempt {seed_counter} failed")
-            continue
-        else:
-            break
-    else:
-        print(
-            f"I exhausted random sets of offsets at {SEEDS_TO_TRY=}"
-            "Quitting because I'm too likely to pull overlapping results"
+    spacer = get_quasi_randos if sampler.endswith("quasi") else get_spaced_randos
+    if sampler.startswith("weighted"):
+        counts = get_hourly_counts(subreddit, after, before)
+        offsets = get_weighted_randos(
+            counts, queries_total, PUSHSHIFT_LIMIT, seed, spacer
         )
-        raise RuntimeError
+    else:
+        # offsets more than hours_needed apart don't overlap (see is_overlapping)
+        hours_needed = math.ceil(PUSHSHIFT_LIMIT / results_per_hour)
+        offsets = spacer(duration.in_hours(), queries_total, hours_needed + 1, seed)
 
     offsets_as_datetime = []
     for offset_as_hour in offsets:
@@ -212,7 +402,7 @@ def main():
         f"   across {len(offsets)} offsets,"
         f" at {PUSHSHIFT_LIMIT} messages per offset,"
         f" for {sample_size} message samples\n"
-        f"   a {sample_size/total:.0%} sample"
+        f"   a {sample_size / total:.0%} sample"
     )
 
     import doctest
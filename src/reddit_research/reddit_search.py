@@ -19,8 +19,9 @@ import textwrap
 import webbrowser
 from pathlib import Path  # https://docs.python.org/3/library/pathlib.html
 
-import pandas as pd
-import requests
+from reddit_research import web_utils
+
+pd = web_utils.lazy_import("pandas")
 
 HOME = Path.home()
 HEADERS = {"User-Agent": "Reddit Search https://github.com/reagle/reddit"}
@@ -36,13 +37,13 @@ def auto_search(query: str, subreddit: str, quote: str, target_url: str) -> None
 
     if "redditsearch.io" in query:  # use pushshift for auto_search
         query = (
-            "https://api.pushshift.io/reddit/submission/search/"
+            web_utils.pushshift_url()
             + "?subreddit={subreddit}&q={quote}"
         )
 
     query_inexact = query.format(subreddit=subreddit, quote=quote)
     log.info(f"{query_inexact=}")
-    response = requests.get(query_inexact, headers=HEADERS)
+    response = web_utils.fetch(query_inexact, headers=HEADERS, check=False)
 
     # remove url scheme and netloc from https://old.reddit.com/...
     target_url = "/".join(target_url.split("/")[3:])  # TODO use urllib.parse
@@ -62,7 +63,7 @@ def auto_search(query: str, subreddit: str, quote: str, target_url: str) -> None
         log.info(f"{query=}")
         query_exact = query.format(subreddit=subreddit, quote=f'"{quote}"')
         log.info(f"{query_exact=}")
-        response = requests.get(query_exact, headers=HEADERS)
+        response = web_utils.fetch(query_exact, headers=HEADERS, check=False)
         if target_url in response.text:
             print(f"auto_search: found exact at {query_exact[0:30]}")
             return
@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+"""Serve the parts of Reddit's API this package uses, from local dumps.
+
+A stand-in for `oauth.reddit.com` that PRAW can be pointed at (see
+`web_utils.get_reddit` and `$REDDIT_API_URL`), answering from JSONL or
+Parquet dumps of submissions (and, optionally, comments):
+
+    /api/v1/access_token     any credentials get a token
+    /api/info?id=t3_a,...    submissions by fullname, as `Reddit.info()`
+    /r/{sub}/about           subreddit, as `Reddit.subreddit()`
+    /r/{sub}/new             newest submissions, as `Subreddit.new()` and streams
+    /comments/{id}           submission and its comments
+    /user/{name}/about       redditor
+    /user/{name}/submitted   their submissions (also `comments`, `overview`)
+
+Deletions and removals can be injected, at random (by id, per `--seed`)
+and spread over `--churn` seconds so repeated watches see them happen,
+or explicitly with `POST /_fixture/{delete,delete-author,remove}?id=...`.
+Latency, Reddit's rate-limit headers, and random 429s let prefetch
+throughput and retry behavior be measured without touching reddit.com:
+
+    reddit-server dumps/ --latency 100 --remove 0.1 --churn 3600 &
+    REDDIT_API_URL=http://127.0.0.1:8766 reddit-watch ...
+"""
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2020-2023 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "1.0"
+
+import argparse  # http://docs.python.org/dev/library/argparse.html
+import itertools
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from reddit_research.pushshift_server import (
+    RateWindow,
+    dump_paths,
+    read_jsonl,
+    read_parquet,
+)
+
+log = logging.getLogger("reddit_server")
+
+LISTING_LIMIT = 25  # Reddit's default page size
+MAX_LISTING_LIMIT = 100
+INFO_LIMIT = 100  # fullnames per /api/info request
+FATES = ("delete-author", "delete", "remove")
+NOT_FOUND = (404, {"message": "Not Found", "error": 404})
+
+
+@dataclass(frozen=True)
+class Fate:
+    """A change to a submission, visible from `at` (seconds since start)."""
+
+    kind: str  # one of FATES
+    at: float = 0.0
+
+
+def apply_fate(post: dict, fate: Fate) -> dict:
+    """Return a copy of post as Reddit shows it after the fate.
+
+    >>> apply_fate({"author": "a", "selftext": "hi"}, Fate("remove"))["selftext"]
+    '[removed]'
+    """
+    post = dict(post)
+    if fate.kind == "delete-author":
+        post["author"] = "[deleted]"
+    elif fate.kind == "delete":
+        post.update(
+            author="[deleted]",
+            selftext="[deleted]",
+            title="[deleted by user]",
+            removed_by_category="deleted",
+        )
+    elif fate.kind == "remove":
+        post.update(selftext="[removed]", removed_by_category="moderator")
+    return post
+
+
+def listing(children: Iterable[dict], after: str | None = None) -> dict:
+    """Return Reddit's `Listing` of things (dicts with kind and data)."""
+    children = list(children)
+    return {
+        "kind": "Listing",
+        "data": {
+            "after": after,
+            "before": None,
+            "dist": len(children),
+            "modhash": "",
+            "children": children,
+        },
+    }
+
+
+def page(items: list[dict], params: dict[str, str], kind: str) -> dict:
+    """Return a listing page of items per the `after`, `before`, and `limit` params.
+
+    Items before an item, as PRAW's streams ask for, are those newer.
+    """
+    start = 0
+    names = [f"{kind}_{item['id']}" for item in items]
+    limit = min(int(params.get("limit", LISTING_LIMIT)), MAX_LISTING_LIMIT)
+    if after := params.get("after"):
+        start = names.index(after) + 1 if after in names else len(items)
+    elif before := params.get("before"):
+        # those just newer than it, else none
+        end = names.index(before) if before in names else 0
+        start = max(end - limit, 0)
+        items = items[:end]
+    chunk = items[start : start + limit]
+    more = start + limit < len(items)
+    return listing(
+        ({"kind": kind, "data": item} for item in chunk),
+        f"{kind}_{chunk[-1]['id']}" if chunk and more else None,
+    )
+
+
+def as_submission(post: dict) -> dict:
+    """Return post with the fields PRAW expects of a submission."""
+    post = dict(post)
+    post.setdefault("name", f"t3_{post['id']}")
+    post.setdefault("title", "")
+    post.setdefault("selftext", "")
+    post.setdefault("author", "[deleted]")
+    post.setdefault("removed_by_category", None)
+    post.setdefault("num_comments", 0)
+    post.setdefault(
+        "permalink", f"/r/{post.get('subreddit', '')}/comments/{post['id']}/"
+    )
+    post.setdefault("url", f"https://www.reddit.com{post['permalink']}")
+    return post
+
+
+def as_comment(comment: dict) -> dict:
+    """Return comment with the fields PRAW expects of a comment."""
+    comment = dict(comment)
+    comment.setdefault("name", f"t1_{comment['id']}")
+    comment.setdefault("author", "[deleted]")
+    comment.setdefault("body", "")
+    comment.setdefault("replies", "")
+    return comment
+
+
+class FixtureStore:
+    """Submissions and comments by id, subreddit, and author, with fates."""
+
+    def __init__(
+        self,
+        seed: int = 0,
+        rates: dict[str, float] | None = None,
+        churn: float = 0.0,
+    ):
+        self.seed = seed
+        self.rates = rates or {}  # fraction of submissions per fate
+        self.churn = churn  # random fates happen within this many seconds
+        self.started = time.time()
+        self.posts: dict[str, dict] = {}
+        self.comments: dict[str, list[dict]] = {}  # by submission id
+        self._by_subreddit: dict[str, list[str]] = {}  # newest first
+        self._by_author: dict[str, list[str]] = {}
+        self._fates: dict[str, Fate] = {}  # injected, overriding random ones
+        self._lock = threading.Lock()
+
+    def add_posts(self, records: Iterable[dict], subreddit: str = "") -> int:
+        added = 0
+        for record in records:
+            record.setdefault("subreddit", subreddit)
+            record["created_utc"] = int(float(record.get("created_utc") or 0))
+            self.posts[record["id"]] = record
+            added += 1
+        self._by_subreddit.clear()
+        self._by_author.clear()
+        newest = sorted(
+            self.posts.values(), key=lambda p: p["created_utc"], reverse=True
+        )
+        for post in newest:
+            name = post["subreddit"].lower()
+            self._by_subreddit.setdefault(name, []).append(post["id"])
+            if author := post.get("author"):
+                self._by_author.setdefault(author.lower(), []).append(post["id"])
+        return added
+
+    def add_comments(self, records: Iterable[dict]) -> int:
+        added = 0
+        for record in records:
+            link_id = (record.get("link_id") or "").removeprefix("t3_")
+            self.comments.setdefault(link_id, []).append(record)
+            added += 1
+        return added
+
+    def load(self, path: Path) -> int:
+        """Load a dump named like `{subreddit}_{submissions,comments}.jsonl`."""
+        subreddit = re.split(r"_(?:submissions|comments)", path.name)[0]
+        records = read_parquet(path) if path.suffix == ".parquet" else read_jsonl(path)
+        if "_comments" in path.name:
+            added = self.add_comments(records)
+        else:
+            added = self.add_posts(records, subreddit)
+        log.info(f"loaded {added:,} from {path}")
+        return added
+
+    def inject(self, id_: str, kind: str) -> None:
+        """Make a fate happen to a submission now."""
+        if kind not in FATES:
+            raise ValueError(f"unknown fate {kind!r}")
+        with self._lock:
+            self._fates[id_] = Fate(kind, time.time() - self.started)
+
+    def fate(self, id_: str) -> Fate | None:
+        """Return the submission's injected or (seeded) random fate, if any."""
+        with self._lock:
+            if id_ in self._fates:
+                return self._fates[id_]
+        rng = random.Random(f"{self.seed}:{id_}")
+        draw, at = rng.random(), rng.uniform(0, self.churn)
+        for kind in FATES:
+            if draw < (rate := self.rates.get(kind, 0.0)):
+                return Fate(kind, at)
+            draw -= rate
+        return None
+
+    def post(self, id_: str) -> dict | None:
+        """Return the submission as Reddit would show it now, or None."""
+        if (post := self.posts.get(id_)) is None:
+            return None
+        fate = self.fate(id_)
+        if fate is not None and time.time() - self.started >= fate.at:
+            post = apply_fate(post, fate)
+        return as_submission(post)
+
+    def subreddit(self, name: str) -> dict | None:
+        """Return a subreddit's about data, derived from its submissions."""
+        if not (ids := self._by_subreddit.get(name.lower())):
+            return None
+        display_name = self.posts[ids[0]]["subreddit"]
+        created = self.posts[ids[-1]]["created_utc"]
+        authors = {self.posts[id_].get("author") for id_ in ids}
+        return {
+            "display_name": display_name,
+            "id": display_name.lower(),
+            "name": f"t5_{display_name.lower()}",
+            "created": created,
+            "created_utc": created,
+            "subscribers": len(authors),
+        }
+
+    def new(self, name: str) -> list[dict]:
+        """Return a subreddit's submissions, newest first."""
+        return [self.post(id_) for id_ in self._by_subreddit.get(name.lower(), [])]
+
+    def submitted(self, author: str) -> list[dict]:
+        """Return an author's submissions, newest first, as still attributed."""
+        posts = (self.post(id_) for id_ in self._by_author.get(author.lower(), []))
+        return [p for p in posts if p and p["author"].lower() == author.lower()]
+
+    def authored_comments(self, author: str) -> list[dict]:
+        """Return an author's comments, newest first."""
+        comments = [
+            as_comment(c)
+            for c in itertools.chain.from_iterable(self.comments.values())
+            if (c.get("author") or "").lower() == author.lower()
+        ]
+        return sorted(comments, key=lambda c: c.get("created_utc", 0), reverse=True)
+
+
+class RedditServer(ThreadingHTTPServer):
+    """HTTP server answering Reddit API requests from a `FixtureStore`."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        store: FixtureStore,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate: int = 0,
+        error_rate: float = 0.0,
+        retry_after: int = 1,
+    ):
+        super().__init__(address, RedditHandler)
+        self.store = store
+        self.latency = latency  # seconds added to every response
+        self.jitter = jitter  # seconds, uniformly random, added to latency
+        self.window = RateWindow(rate) if rate else None
+        self.error_rate = error_rate  # fraction of requests refused with 429
+        self.retry_after = retry_after  # seconds, in those refusals
+        self.requests = 0
+        self.ids_served = 0  # submissions returned by /api/info
+
+    @property
+    def url(self) -> str:
+        """Base URL to use as `$REDDIT_API_URL`."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> threading.Thread:
+        """Serve from a daemon thread, e.g., within a benchmark."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class RedditHandler(BaseHTTPRequestHandler):
+    """Route GETs to the store; POSTs get tokens or inject fates."""
+
+    server: RedditServer
+
+    def do_POST(self) -> None:
+        parts = urlsplit(self.path)
+        form = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        query = "&".join(filter(None, [parts.query, form.decode()]))
+        params = {k: v[-1] for k, v in parse_qs(query).items()}
+        if parts.path.rstrip("/") == "/api/v1/access_token":
+            self.reply(
+                200,
+                {
+                    "access_token": "stand-in",
+                    "token_type": "bearer",
+                    "expires_in": 86400,
+                    "scope": "*",
+                },
+            )
+        elif parts.path.startswith("/_fixture/"):
+            kind = parts.path.removeprefix("/_fixture/").strip("/")
+            try:
+                for id_ in params.get("id", "").split(","):
+                    self.server.store.inject(id_.removeprefix("t3_"), kind)
+            except ValueError as err:
+                self.reply(400, {"message": str(err), "error": 400})
+                return
+            self.reply(200, {"injected": kind, "id": params.get("id", "")})
+        else:
+            self.reply(*NOT_FOUND)
+
+    def do_GET(self) -> None:
+        self.server.requests += 1
+        headers = {}
+        if self.server.window is not None:
+            admitted, remaining, reset = self.server.window.admit()
+            used = self.server.window.per_minute - remaining
+            headers = {
+                "X-Ratelimit-Used": str(used),
+                "X-Ratelimit-Remaining": str(remaining),
+                "X-Ratelimit-Reset": f"{reset:.0f}",
+            }
+            if not admitted:
+                self.refuse(headers, reset)
+                return
+        if random.random() < self.server.error_rate:
+            self.refuse(headers, self.server.retry_after)
+            return
+        if delay := self.server.latency + random.uniform(0, self.server.jitter):
+            time.sleep(delay)
+        parts = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        path = parts.path.removesuffix(".json").rstrip("/")
+        status, body = self.route(path, params)
+        self.reply(status, body, headers)
+
+    # handlers of ROUTES, each returning (status, body)
+    def info(self, params: dict[str, str]) -> tuple[int, dict | list]:
+        store = self.server.store
+        fullnames = params.get("id", "").split(",")[:INFO_LIMIT]
+        posts = [store.post(name.removeprefix("t3_")) for name in fullnames]
+        found = [post for post in posts if post is not None]
+        self.server.ids_served += len(found)
+        return 200, listing({"kind": "t3", "data": p} for p in found)
+
+    def subreddit_about(
+        self, params: dict[str, str], name: str
+    ) -> tuple[int, dict | list]:
+        if (about := self.server.store.subreddit(name)) is None:
+            return NOT_FOUND
+        return 200, {"kind": "t5", "data": about}
+
+    def subreddit_new(
+        self, params: dict[str, str], name: str
+    ) -> tuple[int, dict | list]:
+        return 200, page(self.server.store.new(name), params, "t3")
+
+    def comments(self, params: dict[str, str], id_: str) -> tuple[int, dict | list]:
+        store = self.server.store
+        if (post := store.post(id_)) is None:
+            return NOT_FOUND
+        comments = [as_comment(c) for c in store.comments.get(id_, [])]
+        return 200, [
+            listing([{"kind": "t3", "data": post}]),
+            listing({"kind": "t1", "data": c} for c in comments),
+        ]
+
+    def user_about(self, params: dict[str, str], name: str) -> tuple[int, dict | list]:
+        store = self.server.store
+        if not (store.submitted(name) or store.authored_comments(name)):
+            return NOT_FOUND
+        return 200, {"kind": "t2", "data": {"name": name, "id": name.lower()}}
+
+    def user_submitted(
+        self, params: dict[str, str], name: str
+    ) -> tuple[int, dict | list]:
+        return 200, page(self.server.store.submitted(name), params, "t3")
+
+    def user_comments(
+        self, params: dict[str, str], name: str
+    ) -> tuple[int, dict | list]:
+        return 200, page(self.server.store.authored_comments(name), params, "t1")
+
+    # paths, less any `.json` and trailing slash, and their handlers, by precedence
+    ROUTES = (
+        (re.compile(r"/api/info"), info),
+        (re.compile(r"/r/(?P<name>[^/]+)/about"), subreddit_about),
+        (re.compile(r"/r/(?P<name>[^/]+)/new"), subreddit_new),
+        (re.compile(r"/comments/(?P<id_>[^/]+)(/.*)?"), comments),
+        (re.compile(r"/u(ser)?/(?P<name>[^/]+)/about"), user_about),
+        (re.compile(r"/u(ser)?/(?P<name>[^/]+)/submitted"), user_submitted),
+        (re.compile(r"/u(ser)?/(?P<name>[^/]+)/comments"), user_comments),
+        (re.compile(r"/u(ser)?/(?P<name>[^/]+)(/overview)?"), user_submitted),
+    )
+
+    def route(self, path: str, params: dict[str, str]) -> tuple[int, dict | list]:
+        """Return (status, body) from the handler of the first route matching path."""
+        for pattern, handler in self.ROUTES:
+            if match := pattern.fullmatch(path):
+                return handler(self, params, **match.groupdict())
+        return NOT_FOUND
+
+    def refuse(self, headers: dict[str, str], retry_after: float) -> None:
+        headers = {**headers, "Retry-After": f"{retry_after:.0f}"}
+        self.reply(429, {"message": "Too Many Requests", "error": 429}, headers)
+
+    def reply(
+        self, status: int, body: dict | list, headers: dict[str, str] | None = None
+    ) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        log.debug(format % args)
+
+
+def process_args(argv) -> argparse.Namespace:
+    """Process arguments."""
+    arg_parser = argparse.ArgumentParser(
+        description="Serve Reddit API lookups from local dumps."
+    )
+    arg_parser.add_argument(
+        "dumps",
+        type=Path,
+        nargs="+",
+        help="dump files, or directories of them, named like"
+        + " SUBREDDIT_submissions.jsonl[.zst] (or _comments) or .parquet",
+    )
+    arg_parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="address to listen on (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        default=8766,
+        help="port to listen on (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        metavar="MS",
+        help="milliseconds added to each response (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        metavar="MS",
+        help="up to MS more milliseconds, at random (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--rate",
+        type=int,
+        default=0,
+        metavar="N",
+        help="answer N requests a minute, then 429 (default: unlimited)",
+    )
+    arg_parser.add_argument(
+        "--errors",
+        type=float,
+        default=0.0,
+        metavar="FRACTION",
+        help="refuse FRACTION of requests with 429 (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--delete-author",
+        type=float,
+        default=0.0,
+        metavar="FRACTION",
+        help="FRACTION of submissions whose author is deleted (default: 0)",
+    )
+    arg_parser.add_argument(
+        "--delete",
+        type=float,
+        default=0.0,
+        metavar="FRACTION",
+        help="FRACTION of submissions deleted by their author (default: 0)",
+    )
+    arg_parser.add_argument(
+        "--remove",
+        type=float,
+        default=0.0,
+        metavar="FRACTION",
+        help="FRACTION of submissions removed by moderators (default: 0)",
+    )
+    arg_parser.add_argument(
+        "--churn",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="spread deletions and removals over SECONDS after start"
+        + " (default: all at start)",
+    )
+    arg_parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="which submissions meet which fate (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "-V",
+        "--verbose",
+        action="count",
+        default=0,
+        help="increase verbosity from critical though error, warning, info, and debug",
+    )
+    arg_parser.add_argument("--version", action="version", version="0.1")
+    args = arg_parser.parse_args(argv)
+    log_level = (logging.CRITICAL) - (args.verbose * 10)
+    logging.basicConfig(
+        level=log_level, format="%(levelname).4s %(funcName).10s| %(message)s"
+    )
+    return args
+
+
+def main() -> None:
+    """Load the dumps and serve until interrupted."""
+    args = process_args(sys.argv[1:])
+    rates = {
+        "delete-author": args.delete_author,
+        "delete": args.delete,
+        "remove": args.remove,
+    }
+    store = FixtureStore(args.seed, rates, args.churn)
+    for path in dump_paths(args.dumps):
+        store.load(path)
+    server = RedditServer(
+        (args.host, args.port),
+        store,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        rate=args.rate,
+        error_rate=args.errors,
+    )
+    print(f"serving {len(store.posts):,} submissions; use REDDIT_API_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,17 +8,21 @@
 # ///
 """Fetch all posts from a Reddit user and export to CSV."""
 
+from __future__ import annotations
+
 import argparse
 import csv
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
+
+from reddit_research.web_utils import get_credential, lazy_import
 
-import praw
-from praw.models import Redditor, Submission
+if TYPE_CHECKING:
+    from praw.models import Redditor
 
-from reddit_research.web_utils import get_credential
+praw = lazy_import("praw")
 
 
 def process_args(argv: list[str] | None) -> argparse.Namespace:
@@ -1,9 +1,18 @@
 #!/usr/bin/env python3
-"""Watch the deletion and moderation status of messages tracked in a CSV.
-
-You must initialize the subreddit you wish to follow first.
+"""Watch the deletion and moderation status of messages tracked in a store.
+
+You must initialize the subreddit you wish to follow first. Watched
+submissions' status is kept in an SQLite store (see `watch_store`),
+with an append-only log of changes (see `event_log`) from which any
+earlier snapshot can be had; each watch can be exported as a CSV.
+Each run checks only the submissions due: often while they are young
+or changing, less often as they age, and not at all past a horizon.
+Run from cron or launchd, or resident with `--daemon`, which also adds
+new submissions to the watches as they're posted.
 """
 
+from __future__ import annotations
+
 __author__ = "Joseph Reagle"
 __copyright__ = "Copyright (C) 2022-2023 Joseph Reagle"
 __license__ = "GLPv3"
@@ -12,45 +21,48 @@ __version__ = "1.0"
 import argparse  # http://docs.python.org/dev/library/argparse.html
 import collections
 import configparser as cp
+import datetime as dt
+import itertools
 import logging as log
 import pprint
+import signal
 import sys
-import zipfile  # https://docs.python.org/3/library/zipfile.html
+import time
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
-import pandas as pd
-import pendulum  # https://pendulum.eustace.io/docs/
-import praw  # type: ignore # https://praw.readthedocs.io/en/latest
-import tqdm  # progress bar https://github.com/tqdm/tqdm
+from reddit_research import event_log, watch_store, web_utils
 
-from reddit_research import web_utils
+pd = web_utils.lazy_import("pandas")
+pendulum = web_utils.lazy_import("pendulum")  # https://pendulum.eustace.io/docs/
+prawcore = web_utils.lazy_import("prawcore")
+requests = web_utils.lazy_import("requests")
+tqdm = web_utils.lazy_import("tqdm")  # progress bar https://github.com/tqdm/tqdm
 
 HOMEDIR = Path.home()
 DATA_DIR = HOMEDIR / "data/1work/2020/reddit-del/"
-INI_FN = DATA_DIR / "watch-REDDIT.ini"
-NOW = pendulum.now("UTC")
-NOW_STR = NOW.format("YYYYMMDD HH:mm:ss")
+INI_FN = DATA_DIR / "watch-REDDIT.ini"  # of watched CSVs, before the store
+STORE_FN = DATA_DIR / "watch.sqlite"
+NOW = dt.datetime.now(dt.UTC)
+NOW_STR = NOW.strftime("%Y%m%d %H:%M:%S")
 PUSHSHIFT_LIMIT = 100
 REDDIT_LIMIT = 100
+CHECK_MIN = dt.timedelta(minutes=15)  # between checks of young or changing posts
+CHECK_MAX = dt.timedelta(days=2)
+CHECK_BACKOFF = 0.25  # of a settled post's age, between its checks
+HORIZON_DAYS = 30  # of age, after which a post is no longer checked
+POLL_MINUTES = 15  # between a daemon's polls of a subreddit's new submissions
+RETRY_DELAY = dt.timedelta(minutes=1)  # before a daemon retries after errors
 pp = pprint.PrettyPrinter(indent=4)
 
-REDDIT = praw.Reddit(
-    user_agent=web_utils.get_credential("REDDIT_USER_AGENT"),
-    client_id=web_utils.get_credential("REDDIT_CLIENT_ID"),
-    client_secret=web_utils.get_credential("REDDIT_CLIENT_SECRET"),
-    username=web_utils.get_credential("REDDIT_USERNAME"),
-    password=web_utils.get_credential("REDDIT_PASSWORD"),
-    ratelimit_seconds=600,
-)
 
-
-def init_watch_pushshift(subreddit: str, hours: int) -> Path:
-    """Initiate watch of subreddit using Pushshift, create CSV, return filename."""
+def init_watch_pushshift(subreddit: str, hours: int) -> pd.DataFrame:
+    """Initiate watch of subreddit using Pushshift, return its rows."""
     import psaw
 
     print(f"\nInitializing watch on {subreddit}")
-    hours_ago = NOW.subtract(hours=hours)
-    hours_ago_as_timestamp = hours_ago.int_timestamp
+    hours_ago = NOW - dt.timedelta(hours=hours)
+    hours_ago_as_timestamp = int(hours_ago.timestamp())
     print(f"fetching initial posts from {subreddit}")
     pushshift = psaw.PushshiftAPI()
     submissions = pushshift.search_submissions(
@@ -58,49 +70,26 @@ def init_watch_pushshift(subreddit: str, hours: int) -> Path:
         subreddit=subreddit,
         filter=["id", "subreddit", "author", "created_utc"],
     )
-
-    submissions_d = collections.defaultdict(list)
-    for submission in submissions:
-        created_utc_human = pendulum.from_timestamp(submission.created_utc).format(
-            "YYYYMMDD HH:mm:ss"
-        )
-
-        submissions_d["id"].append(submission.id)
-        submissions_d["subreddit"].append(submission.subreddit)
-        submissions_d["author_p"].append(submission.author)
-        submissions_d["del_author_p"].append("FALSE")
-        submissions_d["created_utc"].append(created_utc_human)
-        submissions_d["found_utc"].append(NOW_STR)
-        submissions_d["checked_utc"].append(NOW_STR)
-        submissions_d["del_author_r"].append("FALSE")
-        submissions_d["del_author_r_utc"].append("NA")
-        submissions_d["del_text_r"].append("FALSE")
-        submissions_d["del_text_r_utc"].append("NA")
-        submissions_d["rem_text_r"].append("FALSE")
-        submissions_d["rem_text_r_utc"].append("NA")
-        submissions_d["removed_by_category_r"].append("FALSE")
-
-    watch_fn = (
-        DATA_DIR
-        / f"watch-{subreddit}-{NOW.format('YYYYMMDD')}_n{len(submissions_d['id'])}.csv"
-    )
-    watch_df = pd.DataFrame.from_dict(submissions_d)
-    watch_df.to_csv(watch_fn, index=True, encoding="utf-8-sig", na_rep="NA")
-    return watch_fn
+    return watch_rows(submissions)
 
 
-def init_watch_reddit(subreddit: str, limit: int) -> Path:
-    """Initiate watch of subreddit using Reddit, create CSV, return filename.
+def init_watch_reddit(subreddit: str, limit: int) -> pd.DataFrame:
+    """Initiate watch of subreddit using Reddit, return its rows.
 
     Reddit can return a maximum of only 1000 recent and previous submissions.
     Even when Pushshift is down.
 
     DEPRECATED as Pushshift should have ids which Reddit won't.
     """
-    submissions_d = collections.defaultdict(list)
     print(f"fetching initial posts from {subreddit}")
-    prog_bar = tqdm.tqdm(total=limit)
-    for submission in REDDIT.subreddit(subreddit).new(limit=limit):
+    submissions = web_utils.get_reddit().subreddit(subreddit).new(limit=limit)
+    return watch_rows(tqdm.tqdm(submissions, total=limit))
+
+
+def watch_rows(submissions: Iterable) -> pd.DataFrame:
+    """Return new watch rows of PRAW or Pushshift submissions, found now."""
+    submissions_d = collections.defaultdict(list)
+    for submission in submissions:
         created_utc_human = pendulum.from_timestamp(submission.created_utc).format(
             "YYYYMMDD HH:mm:ss"
         )
@@ -108,26 +97,18 @@ def init_watch_reddit(subreddit: str, limit: int) -> Path:
         submissions_d["id"].append(submission.id)
         submissions_d["subreddit"].append(submission.subreddit)
         submissions_d["author_p"].append(submission.author)
-        submissions_d["del_author_p"].append("FALSE")
+        submissions_d["del_author_p"].append(False)
         submissions_d["created_utc"].append(created_utc_human)
         submissions_d["found_utc"].append(NOW_STR)
         submissions_d["checked_utc"].append(NOW_STR)
-        submissions_d["del_author_r"].append("FALSE")
-        submissions_d["del_author_r_utc"].append("NA")
-        submissions_d["del_text_r"].append("FALSE")
-        submissions_d["del_text_r_utc"].append("NA")
-        submissions_d["rem_text_r"].append("FALSE")
-        submissions_d["rem_text_r_utc"].append("NA")
-        submissions_d["removed_by_category_r"].append("FALSE")
-        prog_bar.update(1)
-    prog_bar.close()
-    watch_fn = (
-        DATA_DIR
-        / f"watch-{subreddit}-{NOW.format('YYYYMMDD')}_n{len(submissions_d['id'])}.csv"
-    )
-    watch_df = pd.DataFrame.from_dict(submissions_d)
-    watch_df.to_csv(watch_fn, index=True, encoding="utf-8-sig", na_rep="NA")
-    return watch_fn
+        submissions_d["del_author_r"].append(False)
+        submissions_d["del_author_r_utc"].append(None)
+        submissions_d["del_text_r"].append(False)
+        submissions_d["del_text_r_utc"].append(None)
+        submissions_d["rem_text_r"].append(False)
+        submissions_d["rem_text_r_utc"].append(None)
+        submissions_d["removed_by_category_r"].append(False)
+    return pd.DataFrame.from_dict(submissions_d)
 
 
 def prefetch_reddit_posts(ids_req: tuple[str]) -> dict:
@@ -136,101 +117,311 @@ def prefetch_reddit_posts(ids_req: tuple[str]) -> dict:
     t3_ids = [i if i.startswith("t3_") else f"t3_{i}" for i in ids_req]
     print(f"prefetching {len(t3_ids)} ids...")
     prog_bar = tqdm.tqdm(total=len(t3_ids))
-    for submission in REDDIT.info(fullnames=t3_ids):
+    for submission in web_utils.get_reddit().info(fullnames=t3_ids):
         submissions_dict[submission.id] = submission
         prog_bar.update(1)
     prog_bar.close()
     return submissions_dict
 
 
-def update_watch(watched_fn: Path) -> Path:
-    """Process a CSV, checking to see if values have changed and timestamping if so."""
-    print(f"Updating {watched_fn=}")
-    assert watched_fn.exists()
-    watched_df = pd.read_csv(watched_fn, encoding="utf-8-sig", index_col=0)
+def status_frame(submissions: dict) -> pd.DataFrame:
+    """Return Reddit's deletion and removal status of submissions, by id."""
+    subs = list(submissions.values())
+    reddit = pd.DataFrame(
+        {
+            "author": [str(s.author) if s.author is not None else None for s in subs],
+            "title": [s.title for s in subs],
+            "selftext": [s.selftext for s in subs],
+            "removed_by_category": [s.removed_by_category for s in subs],
+        },
+        index=pd.Index([s.id for s in subs], name="id", dtype=object),
+    )
+    return pd.DataFrame(
+        {
+            "author_deleted": reddit["author"].isna()
+            | (reddit["author"] == "[deleted]"),
+            "text_deleted": (reddit["selftext"] == "[deleted]")
+            | (reddit["title"] == "[deleted by user]"),
+            "removed": reddit["selftext"] == "[removed]",
+            "removed_by_category": reddit["removed_by_category"]
+            .astype(object)
+            .where(reddit["removed_by_category"].notna(), "False"),
+        },
+        index=reddit.index,
+    )
+
+
+def update_watch(
+    watched_df: pd.DataFrame,
+) -> tuple[pd.DataFrame, pd.Series, pd.Series]:
+    """Check watched rows to see if values have changed, timestamping if so.
+
+    Transitions are computed for all rows at once from a status frame
+    of the prefetched submissions. Return the updated rows, a mask of
+    those Reddit returned, and a mask of those that changed.
+    """
     updated_df = watched_df.copy()
     watched_ids = tuple(watched_df["id"].tolist())
     submissions = prefetch_reddit_posts(watched_ids)
-    for index, row in watched_df.iterrows():
-        id_ = row["id"]
-        if id_ not in submissions:
-            print(f"{id_=} no longer in submissions, continuing")
-            continue
-        log.info(f"{row['id']=}, {row['author_p']=}")
-        sub = submissions[id_]
-        updated_df.at[index, "checked_utc"] = NOW_STR
-        if pd.isna(row["del_author_r_utc"]):
-            if sub.author == "[deleted]" or sub.author is None:
-                print(f"{sub.id=} author deleted {NOW_STR}")
-                updated_df.at[index, "del_author_r"] = True
-                updated_df.at[index, "del_author_r_utc"] = NOW_STR
-        if pd.isna(row["del_text_r_utc"]):
-            if sub.selftext == "[deleted]" or sub.title == "[deleted by user]":
-                print(f"{sub.id=} message deleted {NOW_STR}")
-                updated_df.at[index, "del_text_r"] = True
-                updated_df.at[index, "del_text_r_utc"] = NOW_STR
-        if sub.selftext == "[removed]":
-            category_new = sub.removed_by_category
-            if category_new is None:
-                category_new = "False"
-            category_old = row["removed_by_category_r"]
-            if category_new != category_old:
-                if pd.isna(row["rem_text_r_utc"]):
-                    print(f"{sub.id=} removed {NOW_STR}")
-                    updated_df.at[index, "rem_text_r"] = True
-                    updated_df.at[index, "rem_text_r_utc"] = NOW_STR
-                    updated_df.at[index, "removed_by_category_r"] = category_new
-                if category_new == "deleted":
-                    print("  changed to deleted!")
-                    updated_df.at[index, "del_text_r"] = True
-                    updated_df.at[index, "del_text_r_utc"] = NOW_STR
-                    updated_df.at[index, "removed_by_category_r"] = category_new
-
-    updated_fn = watched_fn.with_name(f"updated-{watched_fn.name}")
-    updated_df.to_csv(updated_fn, index=True, encoding="utf-8-sig", na_rep="NA")
-    return updated_fn
-
-
-def rotate_archive_fns(updated_fn: Path) -> None:
-    """Archive file to the zip file and rename it to be the latest."""
-    print(f"Rotating and archiving {updated_fn=}")
-    if not updated_fn.exists():
-        raise RuntimeError(f"{updated_fn.exists()}")
-    bare_fn = updated_fn.name.removeprefix("updated-").removesuffix(".csv")
-    print(f"{bare_fn=}")
-    stamped_fn = f"{bare_fn}-arch_{NOW.int_timestamp}.csv"
-    print(f"{stamped_fn=}")
-    zipped_fn = f"{bare_fn}-arch.zip"
-    latest_fn = f"{bare_fn}.csv"
-    print(f"{latest_fn=}")
-    latest_path = updated_fn.parent / latest_fn
-    stamped_path = updated_fn.parent / stamped_fn
-    if latest_path.exists() and updated_fn.exists():
-        print("rotating files")
-        latest_path.rename(stamped_path)
-        updated_fn.rename(latest_path)
-    else:
-        raise RuntimeError(f"{latest_path.exists()} {updated_fn.exists()}")
-    zipped_path = updated_fn.parent / zipped_fn
-    if zipped_path.exists():
-        with zipfile.ZipFile(zipped_path, mode="a") as archive:
-            print(f"adding {stamped_fn=} to {zipped_fn}")
-            archive.write(stamped_path, arcname=stamped_fn)
-        print(f"deleting {stamped_fn=}")
-        stamped_path.unlink()
-    else:
-        log.critical(f"can't append stamped, {zipped_fn} not found")
+    found = watched_df["id"].isin(submissions.keys())
+    for id_ in watched_df.loc[~found, "id"]:
+        print(f"{id_=} no longer in submissions, continuing")
+    # one status row per watched row; rows not found are masked by `found`
+    status = (
+        status_frame(submissions)
+        .reindex(watched_df["id"], fill_value=False)
+        .set_axis(watched_df.index)
+    )
+    category_new = status["removed_by_category"]
 
+    author_deleted = (
+        found & watched_df["del_author_r_utc"].isna() & status["author_deleted"]
+    )
+    text_deleted = found & watched_df["del_text_r_utc"].isna() & status["text_deleted"]
+    category_old = watched_df["removed_by_category_r"]
+    recategorized = found & status["removed"] & (category_new != category_old)
+    removed = recategorized & watched_df["rem_text_r_utc"].isna()
+    removed_deleted = recategorized & (category_new == "deleted")
+
+    # timestamps and categories are written into columns read as NaN or bool
+    for column in (
+        "del_author_r_utc",
+        "del_text_r_utc",
+        "rem_text_r_utc",
+        "removed_by_category_r",
+    ):
+        updated_df[column] = updated_df[column].astype(object)
+    updated_df.loc[found, "checked_utc"] = NOW_STR
+    for mask, flag in (
+        (author_deleted, "del_author_r"),
+        (text_deleted | removed_deleted, "del_text_r"),
+        (removed, "rem_text_r"),
+    ):
+        updated_df.loc[mask, flag] = True
+        updated_df.loc[mask, f"{flag}_utc"] = NOW_STR
+    recategory = removed | removed_deleted
+    updated_df.loc[recategory, "removed_by_category_r"] = category_new[recategory]
+
+    for id_ in watched_df.loc[author_deleted, "id"]:
+        print(f"{id_=} author deleted {NOW_STR}")
+    for id_ in watched_df.loc[text_deleted, "id"]:
+        print(f"{id_=} message deleted {NOW_STR}")
+    for id_ in watched_df.loc[removed, "id"]:
+        print(f"{id_=} removed {NOW_STR}")
+    for id_ in watched_df.loc[removed_deleted, "id"]:
+        print(f"{id_=} removed, changed to deleted!")
+
+    changed = author_deleted | text_deleted | removed | removed_deleted
+    return updated_df, found, changed
+
+
+def next_checks(
+    updated_df: pd.DataFrame,
+    changed: pd.Series,
+    observed_utc: int,
+    horizon_days: float = HORIZON_DAYS,
+) -> pd.Series:
+    """Return when each checked row is next due, or NA past the horizon.
+
+    Intervals back off exponentially, being a fraction of a post's age
+    within CHECK_MIN and CHECK_MAX, but are CHECK_MIN again whenever a
+    post changes. Posts older than horizon_days are retired.
+
+    >>> updated_df = pd.DataFrame({"created_utc": ["20230101 00:00:01",
+    ...     "20230101 00:00:00", "20221101 00:00:00"], "found_utc": None})
+    >>> changed = pd.Series([False, True, False])
+    >>> observed_utc = event_log.utc_timestamp("20230103 00:00:00")
+    >>> (next_checks(updated_df, changed, observed_utc) - observed_utc).tolist()
+    [43200, 900, <NA>]
+    """
+    created = pd.to_datetime(
+        updated_df["created_utc"].fillna(updated_df["found_utc"]),
+        format=event_log.UTC_FORMAT,
+        utc=True,
+        errors="coerce",
+    )
+    age = pd.Timestamp(observed_utc, unit="s", tz="UTC") - created
+    interval = (age * CHECK_BACKOFF).clip(CHECK_MIN, CHECK_MAX).fillna(CHECK_MIN)
+    interval[changed.to_numpy()] = CHECK_MIN
+    next_check = observed_utc + interval.dt.total_seconds().round().astype("Int64")
+    return next_check.mask(age > dt.timedelta(days=horizon_days))
+
+
+def update_store(
+    store: watch_store.WatchStore,
+    watch: watch_store.Watch,
+    horizon_days: float = HORIZON_DAYS,
+) -> None:
+    """Update the watch's rows due in the store, writing only what changed."""
+    print(f"Updating {watch.name}")
+    observed_utc = int(NOW.timestamp())
+    watched_df = store.frame(watch.name, due_utc=observed_utc)
+    if watched_df.empty:
+        print("none due")
+        return
+    updated_df, found, changed = update_watch(watched_df)
+    next_check = next_checks(updated_df, changed, observed_utc, horizon_days)
+    written = store.update(
+        watch.name,
+        watched_df,
+        updated_df,
+        found,
+        observed_utc=observed_utc,
+        next_check_utc=next_check,
+    )
+    retired = next_check.isna().sum()
+    print(
+        f"wrote {written} changes to {store.path.name}"
+        f" from {len(watched_df)} due, retiring {retired}"
+    )
 
-def init_archive(updated_fn: Path) -> None:
-    """Initialize the archive file with most recent version."""
-    print(f"Initializing archive for {updated_fn=}")
-    bare_fn = updated_fn.name.removeprefix("updated-").removesuffix(".csv")
-    zipped_fn = updated_fn.parent / f"{bare_fn}-arch.zip"
-    print(f"  creating archive {zipped_fn=}")
 
-    with zipfile.ZipFile(zipped_fn, mode="w") as archive:
-        archive.write(updated_fn, arcname=updated_fn.name)
+def tick() -> None:
+    """Set NOW to the current time, as a long-running process must."""
+    global NOW, NOW_STR
+    NOW = dt.datetime.now(dt.UTC)
+    NOW_STR = NOW.strftime("%Y%m%d %H:%M:%S")
+
+
+def poll_new(
+    store: watch_store.WatchStore, watch: watch_store.Watch, stream: Iterator
+) -> int:
+    """Add submissions new to a subreddit's stream to its watch; return how many."""
+    # a stream yields None once a request of its listing has nothing newer
+    submissions = list(itertools.takewhile(lambda s: s is not None, stream))
+    if not submissions:
+        return 0
+    added = store.add(watch, watch_rows(submissions), int(NOW.timestamp()))
+    print(f"added {added} new submissions to {watch.name}")
+    return added
+
+
+def run_daemon(
+    store: watch_store.WatchStore,
+    poll_minutes: float = POLL_MINUTES,
+    horizon_days: float = HORIZON_DAYS,
+) -> None:
+    """Poll subreddits for new submissions, and check those due, until stopped.
+
+    The PRAW client, the store, and a stream of each subreddit's `new`
+    listing stay open between polls; each subreddit is polled every
+    poll_minutes, and new submissions join its latest watch. Every
+    batch commits to the store, so the daemon can stop at any time.
+    """
+    # stop as on ^C, e.g., when launchd or systemd stops us
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        poll_forever(store, dt.timedelta(minutes=poll_minutes), horizon_days)
+    except KeyboardInterrupt:
+        print("stopping")
+
+
+def transient_errors() -> tuple[type[Exception], ...]:
+    """Return the errors of requests worth retrying, e.g., 5xx, 429, or timeout."""
+    return (prawcore.PrawcoreException, requests.exceptions.RequestException)
+
+
+def poll_subreddits(
+    store: watch_store.WatchStore,
+    watches: list[watch_store.Watch],
+    streams: dict[str, Iterator],
+    next_poll: dict[str, dt.datetime],
+    poll: dt.timedelta,
+) -> bool:
+    """Poll the subreddits due for new submissions; return whether all succeeded."""
+    reddit = web_utils.get_reddit()
+    ok = True
+    # the latest watch of each subreddit, including any since --init'd
+    latest = {watch.subreddit.lower(): watch for watch in watches}
+    for subreddit, watch in latest.items():
+        if subreddit not in streams:
+            streams[subreddit] = reddit.subreddit(watch.subreddit).stream.submissions(
+                pause_after=-1
+            )
+        if next_poll.setdefault(subreddit, NOW) > NOW:
+            continue
+        next_poll[subreddit] = NOW + poll
+        try:
+            poll_new(store, watch, streams[subreddit])
+        except transient_errors() as err:
+            log.warning(f"polling {watch.subreddit} failed: {err!r}")
+            del streams[subreddit]  # which has ended, so recreate it
+            next_poll[subreddit] = NOW + RETRY_DELAY
+            ok = False
+    return ok
+
+
+def update_watches(
+    store: watch_store.WatchStore,
+    watches: list[watch_store.Watch],
+    horizon_days: float,
+) -> bool:
+    """Check each watch's submissions due; return whether all succeeded."""
+    ok = True
+    for watch in watches:
+        try:
+            update_store(store, watch, horizon_days)
+        except transient_errors() as err:
+            # its rows are still due, so are retried next cycle
+            log.warning(f"updating {watch.name} failed: {err!r}")
+            ok = False
+    return ok
+
+
+def poll_forever(
+    store: watch_store.WatchStore, poll: dt.timedelta, horizon_days: float
+) -> None:
+    """Poll each subreddit every poll, checking submissions due in between.
+
+    Errors are logged and retried next cycle; only an interrupt stops it.
+    """
+    streams: dict[str, Iterator] = {}
+    next_poll: dict[str, dt.datetime] = {}
+    while True:
+        tick()
+        try:
+            watches = store.watches()
+            ok = poll_subreddits(store, watches, streams, next_poll, poll)
+            ok = update_watches(store, watches, horizon_days) and ok
+            store.checkpoint()
+            wake = min(next_poll.values(), default=NOW + poll)
+            if (next_due := store.next_due()) is not None:
+                wake = min(wake, dt.datetime.fromtimestamp(next_due, dt.UTC))
+            if not ok:
+                wake = max(wake, NOW + RETRY_DELAY)
+        except Exception as err:  # noqa: BLE001 so the daemon outlives any one cycle
+            log.error(f"cycle failed: {err!r}")
+            wake = NOW + RETRY_DELAY
+        time.sleep(max((wake - dt.datetime.now(dt.UTC)).total_seconds(), 1))
+
+
+def open_store() -> watch_store.WatchStore:
+    """Open the watch store, importing the watched CSVs of INI_FN if it's new."""
+    store = watch_store.WatchStore(STORE_FN)
+    if store.watches() or not INI_FN.exists():
+        return store
+    config = cp.ConfigParser(strict=False)
+    config.read(INI_FN)
+    for name, fn in config["watching"].items():
+        csv_fn = Path(fn)
+        print(f"importing {csv_fn.name} into {STORE_FN.name}")
+        archive_fn = csv_fn.with_name(f"{csv_fn.stem}-arch.zip")
+        watched_df = pd.read_csv(
+            csv_fn, encoding="utf-8-sig", usecols=["subreddit", "found_utc"]
+        )
+        watch = watch_store.Watch(
+            name,
+            watched_df["subreddit"].iloc[0],
+            csv_fn,
+            event_log.utc_timestamp(watched_df["found_utc"].min()),
+        )
+        store.import_csv(
+            watch,
+            int(NOW.timestamp()),
+            archive_fn if archive_fn.exists() else None,
+        )
+    print(f"{INI_FN.name} and CSVs are no longer updated; use --export")
+    return store
 
 
 def process_args(argv) -> argparse.Namespace:
@@ -239,7 +430,8 @@ def process_args(argv) -> argparse.Namespace:
         description=(
             "Watch the deletion/removal status of Reddit messages."
             + " Initialize subreddits to be watched first (e.g.,"
-            + " 'Advice+AmItheAsshole). Schedule using cron or launchd"
+            + " 'Advice+AmItheAsshole). Schedule using cron or launchd,"
+            + " or run with --daemon"
         )
     )
 
@@ -256,6 +448,42 @@ def process_args(argv) -> argparse.Namespace:
         default=24,
         help="""previous HOURS to fetch""",
     )
+    arg_parser.add_argument(
+        "--horizon",
+        type=float,
+        default=HORIZON_DAYS,
+        metavar="DAYS",
+        help="""stop checking submissions older than DAYS
+            (default: %(default)s)""",
+    )
+    arg_parser.add_argument(
+        "-d",
+        "--daemon",
+        action="store_true",
+        default=False,
+        help="""keep running, adding new submissions of watched subreddits
+            and checking those due, until interrupted""",
+    )
+    arg_parser.add_argument(
+        "--poll",
+        type=float,
+        default=POLL_MINUTES,
+        metavar="MINUTES",
+        help="""as a daemon, poll each subreddit for new submissions every
+            MINUTES (default: %(default)s)""",
+    )
+    arg_parser.add_argument(
+        "--export",
+        action="store_true",
+        default=False,
+        help="""write each watch's current CSV, rather than update""",
+    )
+    arg_parser.add_argument(
+        "--snapshot",
+        metavar="TIME",
+        help="""write each watch's CSV as it was at TIME (any pendulum
+            parsable), from its log of changes, rather than update""",
+    )
     arg_parser.add_argument(
         "-L",
         "--log-to-file",
@@ -292,25 +520,42 @@ def process_args(argv) -> argparse.Namespace:
 
 def main():
     args = process_args(sys.argv[1:])
-    config = cp.ConfigParser(strict=False)
+    store = open_store()
 
     if args.init:
-        if not INI_FN.exists():
-            INI_FN.write_text("[watching]")
-        config.read(INI_FN)
         for subreddit in args.init.split("+"):
-            watched_fn = init_watch_pushshift(subreddit, args.hours)
-            config.set("watching", f"{subreddit}{NOW_STR[0:8]}", str(watched_fn))
-            updated_fn = update_watch(watched_fn)
-            init_archive(updated_fn)
-            rotate_archive_fns(updated_fn)
-        with INI_FN.open("w") as configfile:
-            config.write(configfile)
-    else:
-        config.read(INI_FN)
-        for _watched, fn in config["watching"].items():
-            updated_fn = update_watch(Path(fn))
-            rotate_archive_fns(updated_fn)
+            watch_df = init_watch_pushshift(subreddit, args.hours)
+            csv_fn = (
+                DATA_DIR
+                / f"watch-{subreddit}-{NOW.strftime('%Y%m%d')}_n{len(watch_df)}.csv"
+            )
+            watch = watch_store.Watch(
+                f"{subreddit}{NOW_STR[0:8]}".lower(),
+                subreddit,
+                csv_fn,
+                int(NOW.timestamp()),
+            )
+            store.add(watch, watch_df, int(NOW.timestamp()))
+            update_store(store, watch, args.horizon)
+    elif args.export:
+        for watch in store.watches():
+            print(f"wrote {store.export(watch)}")
+    elif args.snapshot:
+        at = pendulum.parse(args.snapshot)
+        for watch in store.watches():
+            snapshot_fn = watch.csv_fn.with_name(
+                f"{watch.csv_fn.stem}-snapshot_{at.format('YYYYMMDDHHmmss')}.csv"
+            )
+            store.snapshot(watch.name, int(at.timestamp())).to_csv(
+                snapshot_fn, index=True, encoding="utf-8-sig", na_rep="NA"
+            )
+            print(f"wrote {snapshot_fn}")
+    elif not args.daemon:
+        for watch in store.watches():
+            update_store(store, watch, args.horizon)
+    if args.daemon:
+        run_daemon(store, args.poll, args.horizon)
+    store.close()
 
 
 if __name__ == "__main__":
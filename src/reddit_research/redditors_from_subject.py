@@ -18,29 +18,20 @@ import csv
 import sys
 from pathlib import Path
 
-import cachier
-import jsonlines
-import praw
-import zstandard as zstd
-from rapidfuzz import fuzz
-from tqdm import tqdm  # type: ignore
-
 from reddit_research import web_utils
 
+jsonlines = web_utils.lazy_import("jsonlines")
+praw = web_utils.lazy_import("praw")
+rapidfuzz = web_utils.lazy_import("rapidfuzz")
+tqdm = web_utils.lazy_import("tqdm")
+zstd = web_utils.lazy_import("zstandard")
+
 __author__ = "Joseph Reagle"
 __copyright__ = "Copyright (C) 2024 Joseph Reagle"
 __license__ = "GLPv3"
 __version__ = "0.1"
 
-
-REDDIT = praw.Reddit(
-    user_agent=web_utils.get_credential("REDDIT_USER_AGENT"),
-    client_id=web_utils.get_credential("REDDIT_CLIENT_ID"),
-    client_secret=web_utils.get_credential("REDDIT_CLIENT_SECRET"),
-    username=web_utils.get_credential("REDDIT_USERNAME"),
-    password=web_utils.get_credential("REDDIT_PASSWORD"),
-    ratelimit_seconds=600,
-)
+DUMPS_PATH = Path("~/data/1work/2020/advice/subreddits/").expanduser()
 
 
 def process_args(argv: list) -> argparse.Namespace:
@@ -66,22 +57,24 @@ def decompress_file(compressed_file: Path) -> Path:
     return decompressed_file
 
 
-@cachier.cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
+@web_utils.lazy_cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
 def count_lines(file_path: Path) -> int:
     return sum(1 for _ in file_path.open())
 
 
-@cachier.cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
+@web_utils.lazy_cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
 def api_get_post_url(subreddit: str, title: str) -> tuple[str, str]:
     """Search for a post in a subreddit by title and return its URL."""
     # NOTE: I'm not using this presently since the Reddit API won't
     # return titles of deleted or removed messages.
-    for submission in REDDIT.subreddit(subreddit).search(title, limit=1):
+    for submission in (
+        web_utils.get_reddit().subreddit(subreddit).search(title, limit=1)
+    ):
         return (submission.title, submission.url)
     return ("", "")
 
 
-@cachier.cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
+@web_utils.lazy_cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
 def jsonl_get_post_url(subreddit: str, title: str) -> tuple[str, str]:
     """Get Reddit data dump given subreddit name.
 
@@ -89,8 +82,6 @@ def jsonl_get_post_url(subreddit: str, title: str) -> tuple[str, str]:
     "{DUMPS_Path}/{subreddit}_submissions.jsonl[.zst]" file;
     Search for the title and return the found title and corresponding URL.
     """
-    DUMPS_PATH = Path("~/data/1work/2020/advice/subreddits/").expanduser()
-
     compressed_file = DUMPS_PATH / f"{subreddit}_submissions.jsonl.zst"
 
     if not compressed_file.exists():
@@ -104,8 +95,8 @@ def jsonl_get_post_url(subreddit: str, title: str) -> tuple[str, str]:
         print(f"Checking {decompressed_file}")
         print(f"Looking for: {title}")
 
-        for obj in tqdm(reader, total=total_lines):
-            similarity_ratio = fuzz.ratio(obj["title"], title)
+        for obj in tqdm.tqdm(reader, total=total_lines):
+            similarity_ratio = rapidfuzz.fuzz.ratio(obj["title"], title)
             if similarity_ratio > 95:
                 print(f"\nFOUND with {similarity_ratio}:")
                 print(f"  {title}")
@@ -119,10 +110,10 @@ def jsonl_get_post_url(subreddit: str, title: str) -> tuple[str, str]:
 # jsonl_get_post_url.clear_cache()
 
 
-@cachier.cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
+@web_utils.lazy_cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
 def api_get_commenters(url: str) -> list[str]:
     """Get the usernames of users who commented on a given post."""
-    submission = REDDIT.submission(url=url)
+    submission = web_utils.get_reddit().submission(url=url)
     usernames = [
         comment.author.name
         for comment in submission.comments.list()
@@ -147,7 +138,7 @@ def process_submissions(input_csv: Path) -> list[dict[str, str]]:
         total_rows = sum(1 for _ in reader)
         csvfile.seek(0)  # Reset the file pointer to the beginning
 
-        progress_bar = tqdm(total=total_rows, desc="Processing submissions")
+        progress_bar = tqdm.tqdm(total=total_rows, desc="Processing submissions")
 
         for row in reader:
             subreddit = row["subreddit"]
@@ -159,7 +150,7 @@ def process_submissions(input_csv: Path) -> list[dict[str, str]]:
             title_red, url_red = jsonl_get_post_url(subreddit, title_ori)
 
             if url_red:
-                diff_ratio = fuzz.ratio(title_ori, title_red)
+                diff_ratio = rapidfuzz.fuzz.ratio(title_ori, title_red)
                 if diff_ratio < 90:
                     url_red = ""
                 else:
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""Store HTTP responses on disk for `web_utils.get_JSON` and `get_HTML`.
+
+Responses are keyed on their normalized URL and indexed in SQLite;
+bodies are zstd-compressed and content-addressed, so identical bodies
+are stored once. Entries can expire (TTL) and the store is kept under
+a size bound by evicting the least recently used entries.
+"""
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2020-2023 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "1.0"
+
+import argparse  # http://docs.python.org/dev/library/argparse.html
+import hashlib
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import zstandard as zstd
+
+log = logging.getLogger("response_store")
+
+CACHE_DIR = Path.home() / ".cache" / "reddit-research"
+STORE_FN = CACHE_DIR / "responses.sqlite"
+MAX_BYTES = 2 * 1024**3  # compressed bodies, before LRU eviction
+EVICT_EVERY = 100  # check the size bound every this many puts
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,  -- sha256 of normalized URL
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,  -- JSON
+    body_hash TEXT NOT NULL REFERENCES bodies(hash),
+    fetched REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed);
+CREATE INDEX IF NOT EXISTS responses_body ON responses(body_hash);
+CREATE TABLE IF NOT EXISTS bodies (
+    hash TEXT PRIMARY KEY,  -- sha256 of raw body
+    data BLOB NOT NULL  -- zstd compressed
+);
+"""
+
+
+def normalize_url(url: str) -> str:
+    """Return URL with lowercased scheme/host, sorted query, and no fragment.
+
+    >>> normalize_url("HTTPS://API.Pushshift.io/x/?b=2&a=1#top")
+    'https://api.pushshift.io/x/?a=1&b=2'
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path, query, "")
+    )
+
+
+def url_key(url: str) -> str:
+    """Return the store key of a URL."""
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+@dataclass
+class StoredResponse:
+    """A response as kept in the store."""
+
+    url: str
+    status: int
+    headers: dict[str, str]  # names lowercased
+    body: bytes
+    fetched: float
+
+
+class ResponseStore:
+    """SQLite index of zstd-compressed, content-addressed response bodies."""
+
+    def __init__(
+        self,
+        path: Path = STORE_FN,
+        ttl: float | None = None,
+        max_bytes: int = MAX_BYTES,
+    ):
+        self.path = path
+        self.ttl = ttl  # seconds; None never expires
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._puts = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def get(self, url: str) -> StoredResponse | None:
+        """Return the stored response for URL, or None if absent or expired."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT r.url, r.status, r.headers, b.data, r.fetched"
+                " FROM responses r JOIN bodies b ON r.body_hash = b.hash"
+                " WHERE r.key = ?",
+                (url_key(url),),
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and row[4] < time.time() - self.ttl:
+                log.info(f"expired {url=}")
+                return None
+            with self._db:
+                self._db.execute(
+                    "UPDATE responses SET accessed = ? WHERE key = ?",
+                    (time.time(), url_key(url)),
+                )
+        body = zstd.ZstdDecompressor().decompress(row[3])
+        return StoredResponse(row[0], row[1], json.loads(row[2]), body, row[4])
+
+    def put(self, url: str, status: int, headers: dict, body: bytes) -> None:
+        """Store a response, replacing any previous one for URL."""
+        body_hash = hashlib.sha256(body).hexdigest()
+        data = zstd.ZstdCompressor(level=3).compress(body)
+        now = time.time()
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO bodies (hash, data) VALUES (?, ?)",
+                    (body_hash, data),
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses"
+                    " (key, url, status, headers, body_hash, fetched, accessed)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        url_key(url),
+                        url,
+                        status,
+                        json.dumps({k.lower(): v for k, v in headers.items()}),
+                        body_hash,
+                        now,
+                        now,
+                    ),
+                )
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._prune(self.ttl, self.max_bytes)
+
+    def prune(
+        self, ttl: float | None = None, max_bytes: int | None = None
+    ) -> tuple[int, int]:
+        """Drop expired, then least recently used, entries.
+
+        Returns the number of responses and bodies deleted.
+        """
+        with self._lock:
+            return self._prune(ttl, max_bytes)
+
+    def _prune(self, ttl: float | None, max_bytes: int | None) -> tuple[int, int]:
+        responses_deleted = 0
+        with self._db:
+            if ttl is not None:
+                responses_deleted += self._db.execute(
+                    "DELETE FROM responses WHERE fetched < ?", (time.time() - ttl,)
+                ).rowcount
+            if max_bytes is not None:
+                # bodies left unreferenced, e.g., by expiry, are deleted below
+                size = self._db.execute(
+                    "SELECT COALESCE(SUM(length(data)), 0) FROM bodies"
+                    " WHERE hash IN (SELECT body_hash FROM responses)"
+                ).fetchone()[0]
+                if size > max_bytes:
+                    # walk from least recently used until under the bound; a
+                    # shared body is freed only with the last response using it
+                    cutoff = None
+                    remaining: dict[str, int] = {}
+                    for accessed, body_hash, body_size, refs in self._db.execute(
+                        "SELECT r.accessed, r.body_hash, length(b.data), c.refs"
+                        " FROM responses r JOIN bodies b ON r.body_hash = b.hash"
+                        " JOIN (SELECT body_hash, COUNT(*) AS refs FROM responses"
+                        " GROUP BY body_hash) c ON r.body_hash = c.body_hash"
+                        " ORDER BY r.accessed"
+                    ):
+                        cutoff = accessed
+                        remaining[body_hash] = remaining.get(body_hash, refs) - 1
+                        if remaining[body_hash]:
+                            continue
+                        size -= body_size
+                        if size <= max_bytes * 0.9:
+                            break
+                    responses_deleted += self._db.execute(
+                        "DELETE FROM responses WHERE accessed <= ?", (cutoff,)
+                    ).rowcount
+            bodies_deleted = self._db.execute(
+                "DELETE FROM bodies WHERE hash NOT IN (SELECT body_hash FROM responses)"
+            ).rowcount
+        if responses_deleted:
+            log.info(f"pruned {responses_deleted=} {bodies_deleted=}")
+        return responses_deleted, bodies_deleted
+
+    def _size(self) -> int:
+        return self._db.execute(
+            "SELECT COALESCE(SUM(length(data)), 0) FROM bodies"
+        ).fetchone()[0]
+
+    def stats(self) -> dict[str, int | float | None]:
+        """Return counts, sizes, and age range of the store."""
+        with self._lock:
+            responses, oldest, newest = self._db.execute(
+                "SELECT COUNT(*), MIN(fetched), MAX(fetched) FROM responses"
+            ).fetchone()
+            bodies = self._db.execute("SELECT COUNT(*) FROM bodies").fetchone()[0]
+            size = self._size()
+        return {
+            "responses": responses,
+            "bodies": bodies,
+            "compressed_bytes": size,
+            "oldest": oldest,
+            "newest": newest,
+        }
+
+    def clear(self) -> None:
+        """Delete everything."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses")
+            self._db.execute("DELETE FROM bodies")
+        self.vacuum()
+
+    def vacuum(self) -> None:
+        """Return freed pages to the file system."""
+        with self._lock:
+            self._db.execute("VACUUM")
+
+
+def process_args(argv) -> argparse.Namespace:
+    """Process arguments."""
+    arg_parser = argparse.ArgumentParser(
+        description="Inspect and prune the HTTP response store of get_JSON/get_HTML."
+    )
+    arg_parser.add_argument(
+        "-f",
+        "--file",
+        type=Path,
+        default=STORE_FN,
+        help="store to use (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "-s",
+        "--show",
+        metavar="URL",
+        help="show headers and start of body stored for URL",
+    )
+    arg_parser.add_argument(
+        "-p",
+        "--prune",
+        action="store_true",
+        default=False,
+        help="prune by --ttl and --max-size, then vacuum",
+    )
+    arg_parser.add_argument(
+        "--ttl",
+        type=float,
+        default=None,
+        metavar="DAYS",
+        help="when pruning, drop responses fetched more than DAYS ago",
+    )
+    arg_parser.add_argument(
+        "--max-size",
+        type=float,
+        default=MAX_BYTES / 1024**2,
+        metavar="MB",
+        help="when pruning, evict LRU beyond MB compressed (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--clear",
+        action="store_true",
+        default=False,
+        help="delete all stored responses",
+    )
+    arg_parser.add_argument("--version", action="version", version="0.1")
+    return arg_parser.parse_args(argv)
+
+
+def main() -> None:
+    """Report on, show, prune, or clear the store."""
+    args = process_args(sys.argv[1:])
+    store = ResponseStore(args.file)
+    if args.clear:
+        store.clear()
+    if args.prune:
+        ttl = args.ttl * 86400 if args.ttl is not None else None
+        responses, bodies = store.prune(ttl, int(args.max_size * 1024**2))
+        print(f"pruned {responses} responses and {bodies} bodies")
+        store.vacuum()
+    if args.show:
+        if (stored := store.get(args.show)) is None:
+            print(f"not stored: {args.show}")
+        else:
+            print(f"{stored.url} {stored.status} fetched {time.ctime(stored.fetched)}")
+            for name, value in stored.headers.items():
+                print(f"  {name}: {value}")
+            print(stored.body[:1000].decode("utf-8", "replace"))
+    stats = store.stats()
+    print(f"{args.file}: {stats['responses']:,} responses, {stats['bodies']:,} bodies,")
+    print(f"  {stats['compressed_bytes'] / 1024**2:,.1f} MB compressed", end="")
+    if stats["oldest"]:
+        print(
+            f", fetched {time.ctime(stats['oldest'])} to {time.ctime(stats['newest'])}"
+        )
+    else:
+        print()
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Compact, fixed-schema records of Reddit submissions' deletion status.
+
+Rather than pickling whole PRAW `Submission` objects (with their client
+and lazy attributes), keep only the fields used to judge deletion and
+removal, plus when they were fetched, in an SQLite table.
+"""
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2009-2023 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "1.0"
+
+import logging
+import sqlite3
+import time
+from collections.abc import Iterable
+from dataclasses import astuple, dataclass
+from pathlib import Path
+from typing import Any
+
+log = logging.getLogger("submission_store")
+
+# selftext is only compared against these, so other text is not kept
+SELFTEXT_MARKERS = frozenset({"[deleted]", "[removed]"})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    author TEXT,  -- NULL when the account is deleted
+    title TEXT NOT NULL,
+    selftext TEXT NOT NULL,  -- a SELFTEXT_MARKERS value or ''
+    removed_by_category TEXT,
+    fetched_utc INTEGER NOT NULL
+);
+-- requested ids Reddit did not return, so a resumed prefetch skips them
+-- until, like submissions, they're older than its max_age
+CREATE TABLE IF NOT EXISTS missing (
+    id TEXT PRIMARY KEY,
+    fetched_utc INTEGER NOT NULL
+);
+"""
+
+
+@dataclass(slots=True, frozen=True)
+class SubmissionRecord:
+    """The fields of a submission that reveal deletion and removal."""
+
+    id: str
+    author: str | None
+    title: str
+    selftext: str
+    removed_by_category: str | None
+    fetched_utc: int
+
+    @classmethod
+    def from_submission(
+        cls, submission: Any, fetched_utc: int | None = None
+    ) -> "SubmissionRecord":
+        """Distill a PRAW `Submission` into a record.
+
+        >>> from types import SimpleNamespace as NS
+        >>> sub = NS(id="abc", author=None, title="Hi", selftext="long text",
+        ...     removed_by_category=None)
+        >>> SubmissionRecord.from_submission(sub, fetched_utc=0)
+        SubmissionRecord(id='abc', author=None, title='Hi', selftext='', removed_by_category=None, fetched_utc=0)
+        """
+        selftext = submission.selftext
+        return cls(
+            id=submission.id,
+            author=str(submission.author) if submission.author else None,
+            title=submission.title,
+            selftext=selftext if selftext in SELFTEXT_MARKERS else "",
+            removed_by_category=submission.removed_by_category,
+            fetched_utc=int(time.time()) if fetched_utc is None else fetched_utc,
+        )
+
+
+class SubmissionStore:
+    """SQLite table of `SubmissionRecord`s keyed by (bare) submission id."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def get(self, id_: str) -> SubmissionRecord | None:
+        """Return the record for id, or None."""
+        row = self._db.execute(
+            "SELECT * FROM submissions WHERE id = ?", (id_,)
+        ).fetchone()
+        return SubmissionRecord(*row) if row else None
+
+    def get_many(self, ids: Iterable[str]) -> dict[str, SubmissionRecord]:
+        """Return {id: record} for those ids that are stored."""
+        records = {}
+        ids = list(ids)
+        for start in range(0, len(ids), 500):  # stay under SQLite's variable limit
+            chunk = ids[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in self._db.execute(
+                f"SELECT * FROM submissions WHERE id IN ({placeholders})", chunk
+            ):
+                records[row[0]] = SubmissionRecord(*row)
+        return records
+
+    def fresh_ids(self, max_age: float | None = None) -> set[str]:
+        """Return ids stored or known missing, fetched within `max_age` seconds."""
+        since = 0 if max_age is None else int(time.time() - max_age)
+        rows = self._db.execute(
+            "SELECT id FROM submissions WHERE fetched_utc >= ?"
+            " UNION SELECT id FROM missing WHERE fetched_utc >= ?",
+            (since, since),
+        )
+        return {row[0] for row in rows}
+
+    def put_batch(
+        self, records: Iterable[SubmissionRecord], missing: Iterable[str] = ()
+    ) -> None:
+        """Durably store a batch of records and the ids that had none."""
+        now = int(time.time())
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?, ?, ?)",
+                (astuple(record) for record in records),
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO missing VALUES (?, ?)",
+                ((id_, now) for id_ in missing),
+            )
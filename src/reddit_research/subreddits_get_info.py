@@ -15,20 +15,10 @@ import datetime
 import sys
 from pathlib import Path
 
-import praw
-import prawcore
-import pytz
-
 from reddit_research import web_utils
 
-REDDIT = praw.Reddit(
-    user_agent=web_utils.get_credential("REDDIT_USER_AGENT"),
-    client_id=web_utils.get_credential("REDDIT_CLIENT_ID"),
-    client_secret=web_utils.get_credential("REDDIT_CLIENT_SECRET"),
-    username=web_utils.get_credential("REDDIT_USERNAME"),
-    password=web_utils.get_credential("REDDIT_PASSWORD"),
-    ratelimit_seconds=600,
-)
+prawcore = web_utils.lazy_import("prawcore")
+pytz = web_utils.lazy_import("pytz")
 
 
 def main() -> None:
@@ -47,7 +37,7 @@ def main() -> None:
         # Iterate through subreddits and write data to the CSV file
         for subreddit in subreddits:
             try:
-                sub = REDDIT.subreddit(subreddit["subreddit"])
+                sub = web_utils.get_reddit().subreddit(subreddit["subreddit"])
                 category = subreddit["category"]
 
                 creation_date = datetime.datetime.fromtimestamp(
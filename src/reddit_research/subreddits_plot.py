@@ -9,14 +9,6 @@ __version__ = "0.2"
 import argparse
 from pathlib import Path
 
-import matplotlib.dates as mdates
-import matplotlib.patheffects as path_effects
-import matplotlib.pyplot as plt
-import pandas as pd
-import seaborn as sns
-from adjustText import adjust_text
-from matplotlib.lines import Line2D
-
 
 def process_args() -> argparse.Namespace:
     """Process command-line arguments."""
@@ -33,6 +25,15 @@ def main() -> None:
     """Enter main."""
     args = process_args()
 
+    # Plotting libraries are slow to import, so wait until past argparse
+    import matplotlib.dates as mdates
+    import matplotlib.patheffects as path_effects
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+    from adjustText import adjust_text
+    from matplotlib.lines import Line2D
+
     # Read in the CSV data
     df = pd.read_csv(args.input, comment="#")
 
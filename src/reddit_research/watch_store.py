@@ -0,0 +1,321 @@
+"""SQLite store of watched submissions' status, and of its changes.
+
+`reddit_watch` once kept each watch's status in a CSV, listed in
+`watch-REDDIT.ini` and rewritten in full every run. Here the
+submissions of every watch are rows of one WAL-mode table, keyed by
+watch and id, as overlapping watches may share submissions. Each batch
+writes only the values that changed, logs them (see `event_log`), and
+commits in one transaction, so concurrent runs don't clobber each
+other. `WatchStore.export` regenerates a watch's CSV.
+"""
+
+from __future__ import annotations
+
+__author__ = "Joseph Reagle"
+__copyright__ = "Copyright (C) 2022-2023 Joseph Reagle"
+__license__ = "GLPv3"
+__version__ = "1.0"
+
+import contextlib as cl
+import logging
+import sqlite3
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from reddit_research import event_log, web_utils
+
+pd = web_utils.lazy_import("pandas")
+
+log = logging.getLogger("watch_store")
+
+# columns of a watch CSV, after its index
+FIELDS = (
+    "id",
+    "subreddit",
+    "author_p",
+    "del_author_p",
+    "created_utc",
+    "found_utc",
+    "checked_utc",
+    "del_author_r",
+    "del_author_r_utc",
+    "del_text_r",
+    "del_text_r_utc",
+    "rem_text_r",
+    "rem_text_r_utc",
+    "removed_by_category_r",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watches (
+    name TEXT PRIMARY KEY,  -- subreddit and start date, e.g., advice20230115
+    subreddit TEXT NOT NULL,
+    csv_fn TEXT NOT NULL,  -- where the watch is exported
+    started_utc INTEGER NOT NULL
+);
+-- values are as written to a watch CSV, with NULL for NA
+CREATE TABLE IF NOT EXISTS submissions (
+    watch TEXT NOT NULL REFERENCES watches (name),
+    id TEXT NOT NULL,
+    subreddit TEXT NOT NULL,
+    author_p TEXT,
+    del_author_p TEXT,
+    created_utc TEXT,
+    found_utc TEXT,
+    checked_utc TEXT,
+    del_author_r TEXT,
+    del_author_r_utc TEXT,
+    del_text_r TEXT,
+    del_text_r_utc TEXT,
+    rem_text_r TEXT,
+    rem_text_r_utc TEXT,
+    removed_by_category_r TEXT,
+    next_check_utc INTEGER,  -- when next due, NULL once no longer checked
+    PRIMARY KEY (watch, id)
+);
+CREATE INDEX IF NOT EXISTS submissions_subreddit ON submissions (subreddit);
+CREATE INDEX IF NOT EXISTS submissions_next_check ON submissions (next_check_utc);
+"""
+
+
+def from_text(frame: pd.DataFrame) -> pd.DataFrame:
+    """Type text columns as `pd.read_csv` would: True and False as bool.
+
+    >>> frame = from_text(pd.DataFrame({"a": ["True", "False"],
+    ...     "b": ["False", "moderator"], "c": [None, None]}))
+    >>> frame.dtypes.tolist(), frame["c"].isna().all()
+    ([dtype('bool'), dtype('O'), dtype('O')], np.True_)
+    """
+    for column in frame.columns:
+        values = frame[column]
+        known = values.notna()
+        if not known.any() or not (values.isin(("True", "False")) | ~known).all():
+            continue
+        flags = values == "True"
+        frame[column] = flags if known.all() else flags.astype(object).where(known)
+    return frame
+
+
+@dataclass(slots=True, frozen=True)
+class Watch:
+    """A subreddit's submissions, watched since a start."""
+
+    name: str
+    subreddit: str
+    csv_fn: Path
+    started_utc: int
+
+
+class WatchStore:
+    """SQLite tables of watches, their submissions' status, and its changes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA + event_log.SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def checkpoint(self) -> None:
+        """Move the write-ahead log into the database, e.g., while idle."""
+        self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    @cl.contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Hold the write lock throughout, so reads within it are current."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.rollback()
+            raise
+        self._db.commit()
+
+    def events(self, watch: str) -> event_log.EventLog:
+        """Return the log of a watch's changes, sharing the store's transactions."""
+        return event_log.EventLog(self.path, self._db, watch)
+
+    def watches(self) -> list[Watch]:
+        """Return the watches, oldest first."""
+        rows = self._db.execute("SELECT * FROM watches ORDER BY started_utc, name")
+        return [
+            Watch(name, subreddit, Path(csv_fn), started_utc)
+            for name, subreddit, csv_fn, started_utc in rows
+        ]
+
+    def _insert(self, watch: Watch, frame: pd.DataFrame, next_check_utc: int) -> int:
+        """Insert a watch and those of its rows not already in it."""
+        self._db.execute(
+            "INSERT OR REPLACE INTO watches VALUES (?, ?, ?, ?)",
+            (watch.name, watch.subreddit, str(watch.csv_fn), watch.started_utc),
+        )
+        text = frame.loc[:, FIELDS].apply(event_log.as_text)
+        before = self._db.total_changes
+        self._db.executemany(
+            f"INSERT OR IGNORE INTO submissions (watch, {', '.join(FIELDS)},"
+            f" next_check_utc) VALUES ({', '.join('?' * (len(FIELDS) + 2))})",
+            (
+                (watch.name, *row, next_check_utc)
+                for row in text.itertuples(index=False)
+            ),
+        )
+        added = self._db.total_changes - before
+        if added < len(frame):
+            log.warning(f"{len(frame) - added} ids already in {watch.name}")
+        return added
+
+    def _watched(self, watch: str, ids: list[str]) -> set[str]:
+        """Return those of ids already in a watch."""
+        watched = set()
+        for start in range(0, len(ids), 500):  # stay under SQLite's variable limit
+            chunk = ids[start : start + 500]
+            watched.update(
+                row[0]
+                for row in self._db.execute(
+                    "SELECT id FROM submissions WHERE watch = ?"
+                    f" AND id IN ({','.join('?' * len(chunk))})",
+                    [watch, *chunk],
+                )
+            )
+        return watched
+
+    def add(self, watch: Watch, frame: pd.DataFrame, observed_utc: int) -> int:
+        """Add a watch, or rows to it, of submissions; return how many were new."""
+        with self._transaction():
+            watched = self._watched(watch.name, frame["id"].tolist())
+            new = frame[~frame["id"].isin(watched)].drop_duplicates("id")
+            added = self._insert(watch, frame, observed_utc)
+            # new to the watch, so new to its log, without scanning the log's ids
+            self.events(watch.name).baseline(new.loc[:, FIELDS], observed_utc)
+        return added
+
+    def import_csv(
+        self, watch: Watch, observed_utc: int, archive_fn: Path | None = None
+    ) -> int:
+        """Add a watch from its CSV and, if given, its `*-arch.zip` history."""
+        frame = pd.read_csv(watch.csv_fn, encoding="utf-8-sig", index_col=0)
+        events = self.events(watch.name)
+        with self._transaction():
+            added = self._insert(watch, frame, observed_utc)
+            if archive_fn is not None:
+                events.import_archive(archive_fn, watch.csv_fn)
+            # ids whose changes weren't archived start from the CSV
+            events.add_baseline(self.frame(watch.name), observed_utc)
+        return added
+
+    def frame(self, watch: str, due_utc: int | None = None) -> pd.DataFrame:
+        """Return a watch's rows, as read from its CSV, or only those due by then."""
+        query = f"SELECT {', '.join(FIELDS)} FROM submissions WHERE watch = ?"
+        params: list = [watch]
+        if due_utc is not None:
+            query += " AND next_check_utc <= ?"
+            params.append(due_utc)
+        rows = self._db.execute(f"{query} ORDER BY rowid", params).fetchall()
+        return from_text(pd.DataFrame(rows, columns=FIELDS))
+
+    def next_due(self) -> int | None:
+        """Return when the next submission is due to be checked, if any."""
+        return self._db.execute(
+            "SELECT MIN(next_check_utc) FROM submissions"
+        ).fetchone()[0]
+
+    def _current(self, watch: str, ids: list[str]) -> pd.Series:
+        """Return the stored values of a watch's ids, by (id, field)."""
+        rows = []
+        for start in range(0, len(ids), 500):  # stay under SQLite's variable limit
+            chunk = ids[start : start + 500]
+            rows += self._db.execute(
+                f"SELECT {', '.join(FIELDS)} FROM submissions WHERE watch = ?"
+                f" AND id IN ({','.join('?' * len(chunk))})",
+                [watch, *chunk],
+            ).fetchall()
+        return (
+            pd.DataFrame(rows, columns=FIELDS).set_index("id").stack(future_stack=True)
+        )
+
+    def update(
+        self,
+        watch: str,
+        before: pd.DataFrame,
+        after: pd.DataFrame,
+        found: pd.Series,
+        *,
+        observed_utc: int,
+        next_check_utc: pd.Series,
+    ) -> int:
+        """Write and log a watch's values changed from before, in one transaction.
+
+        A value another run has changed since before was read is left
+        as is. Each row is next due at next_check_utc, or never if NA.
+        Return the number of values written.
+        """
+        changes = event_log.changes(before, after)
+        checked = pd.DataFrame(
+            {
+                "id": after["id"],
+                "checked_utc": after["checked_utc"].where(found, None),
+                "next_check_utc": next_check_utc.astype(object).where(
+                    next_check_utc.notna(), None
+                ),
+            }
+        )
+        with self._transaction():
+            current = self._current(watch, changes["id"].drop_duplicates().tolist())
+            current = current.reindex(
+                pd.MultiIndex.from_frame(changes[["id", "field"]])
+            ).to_numpy()
+            old = changes["old"].to_numpy()
+            unchanged = (current == old) | (pd.isna(current) & pd.isna(old))
+            changes = changes[unchanged]
+            for field, group in changes.groupby("field"):
+                assert field in FIELDS
+                self._db.executemany(
+                    f"UPDATE submissions SET {field} = ? WHERE watch = ? AND id = ?",
+                    (
+                        (new, watch, id_)
+                        for new, id_ in zip(group["new"], group["id"], strict=True)
+                    ),
+                )
+            # next checks differ by id, so join them in rather than group them
+            self._db.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS checked (id TEXT,"
+                " checked_utc TEXT, next_check_utc INTEGER)"
+            )
+            self._db.execute("DELETE FROM temp.checked")
+            self._db.executemany(
+                "INSERT INTO temp.checked VALUES (?, ?, ?)",
+                checked.itertuples(index=False),
+            )
+            # a later check by another run is kept; max() is NULL if not found
+            self._db.execute(
+                "UPDATE submissions SET checked_utc = coalesce("
+                " max(coalesce(submissions.checked_utc, ''), checked.checked_utc),"
+                " submissions.checked_utc), next_check_utc = checked.next_check_utc"
+                " FROM temp.checked WHERE submissions.watch = ?"
+                " AND submissions.id = checked.id",
+                (watch,),
+            )
+            self.events(watch).append(
+                changes, found.set_axis(after["id"]), observed_utc
+            )
+        return len(changes)
+
+    def snapshot(self, watch: str, at: int = event_log.LATEST) -> pd.DataFrame:
+        """Return a watch's rows as of time at, as text."""
+        return self.events(watch).snapshot(at)
+
+    def export(self, watch: Watch, path: Path | None = None) -> Path:
+        """Write a watch's current rows as its CSV, or to path; return it."""
+        rows = self._db.execute(
+            f"SELECT {', '.join(FIELDS)} FROM submissions WHERE watch = ?"
+            " ORDER BY rowid",
+            (watch.name,),
+        ).fetchall()
+        path = watch.csv_fn if path is None else path
+        pd.DataFrame(rows, columns=FIELDS).to_csv(
+            path, index=True, encoding="utf-8-sig", na_rep="NA"
+        )
+        return path
@@ -1,49 +1,364 @@
 #!/usr/bin/env python3
 """Web utility functions."""
 
+from __future__ import annotations
+
 __author__ = "Joseph Reagle"
 __copyright__ = "Copyright (C) 2020-2023 Joseph Reagle"
 __license__ = "GLPv3"
 __version__ = "1.0"
 
+import atexit
 import contextlib as cl
+import functools
 import html.entities
+import importlib.util
 import json
 import logging
 import os
 import re
-import time
+import sys
+import threading
+import types
+from collections.abc import Callable
 from pathlib import Path
-from typing import Any
-from xml.sax import saxutils
+from typing import TYPE_CHECKING, Any
+
+from reddit_research import metrics, rate_limiter, response_store
 
-import cachier  # https://pypi.org/project/cachier/
-import dotenv  # https://pypi.org/project/python-dotenv/
-import lxml
-import requests  # http://docs.python-requests.org/en/latest/
+if TYPE_CHECKING:
+    import praw  # type: ignore
 
 log = logging.getLogger("web_utils")
 
 
+class _LazyModule(types.ModuleType):
+    """Stand-in for a module that imports it on first attribute access.
+
+    Unlike `importlib.util.LazyLoader` before Python 3.12.3, this is
+    safe when threads race to first use the module: the import goes
+    through the import system's own per-module locks.
+    """
+
+    def __getattr__(self, attr: str) -> Any:
+        module = importlib.import_module(self.__name__)
+        self.__dict__["_module"] = module  # later lookups skip import_module
+        self.__class__ = _LoadedModule
+        return getattr(module, attr)
+
+
+class _LoadedModule(types.ModuleType):
+    """A `_LazyModule` whose module has been imported."""
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.__dict__["_module"], attr)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Return module `name`, executing it only on first attribute access.
+
+    Console scripts import heavy dependencies this way so that `--help`
+    and argument errors don't pay for pandas, PRAW, and the like.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    return _LazyModule(name)
+
+
+def lazy_cachier(
+    skip: Callable[[], bool] | None = None, **cachier_kwargs
+) -> Callable[[Callable], Callable]:
+    """Like `@cachier.cachier(**kwargs)`, but import and wrap on first call.
+
+    Calls made while `skip()` is true bypass the cache.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.cache
+        def cached() -> Callable:
+            import cachier  # https://pypi.org/project/cachier/
+
+            return cachier.cachier(**cachier_kwargs)(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if skip is not None and skip():
+                return func(*args, **kwargs)
+            return cached()(*args, **kwargs)
+
+        wrapper.clear_cache = lambda: cached().clear_cache()  # type: ignore
+        return wrapper
+
+    return decorator
+
+
+dotenv = lazy_import("dotenv")  # https://pypi.org/project/python-dotenv/
+requests = lazy_import("requests")  # http://docs.python-requests.org/en/latest/
+
+# Shared connection pool so repeated fetches reuse TCP+TLS connections
+POOL_SIZE = 10  # connections kept alive per host
+POOL_RETRIES = 3  # connection and 5xx retries, with exponential backoff
+POOL_BACKOFF = 1.0  # seconds; sleeps are 0s, 2s, 4s, ...
+TIMEOUT = (10, 60)  # (connect, read) seconds
+PUSHSHIFT_URL = "https://api.pushshift.io"  # $PUSHSHIFT_URL overrides
+FETCH_ATTEMPTS = 4  # attempts after rate-limit signals or connection failures
+RETRY_STATUSES = (429, 503)  # rate-limit signals, retried by `fetch`
+_SESSION: requests.Session | None = None
+_SESSION_POOL_SIZE = 0
+_SESSION_LOCK = threading.Lock()
+_GROW_LOCK = threading.Lock()
+_STORE: response_store.ResponseStore | None = None
+_STORE_LOCK = threading.Lock()
+
+# Shared across threads; set REDDIT_RESEARCH_LOCK_DIR to share across processes
+LIMITER = rate_limiter.RateLimiter(
+    lock_dir=Path(d) if (d := os.getenv("REDDIT_RESEARCH_LOCK_DIR")) else None
+)
+
+
+def _build_session(
+    pool_size: int = POOL_SIZE,
+    retries: int = POOL_RETRIES,
+    backoff_factor: float = POOL_BACKOFF,
+) -> requests.Session:
+    """Return a connection-pooled session that retries server errors."""
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 504),  # RETRY_STATUSES go to the limiter
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # leave it to `raise_for_status()`
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def configure_session(
+    pool_size: int = POOL_SIZE,
+    retries: int = POOL_RETRIES,
+    backoff_factor: float = POOL_BACKOFF,
+) -> requests.Session:
+    """(Re)build the shared, connection-pooled session used by all fetches.
+
+    Call before fetching to size the pool for concurrent callers.
+    """
+    global _SESSION, _SESSION_POOL_SIZE
+    session = _build_session(pool_size, retries, backoff_factor)
+    with _SESSION_LOCK:
+        if _SESSION is not None:
+            _SESSION.close()
+        _SESSION = session
+        _SESSION_POOL_SIZE = pool_size
+    log.info(f"configured session {pool_size=} {retries=} {backoff_factor=}")
+    return session
+
+
+def ensure_pool_size(pool_size: int) -> None:
+    """Rebuild the shared session only if its pool is smaller than pool_size.
+
+    Rebuilding closes the old session, so size the pool for all concurrent
+    callers before they start; later, smaller requests leave it alone.
+    """
+    with _GROW_LOCK:
+        if _SESSION is None or pool_size > _SESSION_POOL_SIZE:
+            configure_session(pool_size=max(pool_size, POOL_SIZE))
+
+
+def get_session() -> requests.Session:
+    """Return the shared session, creating it with defaults on first use.
+
+    Threads racing to first use share one session; none is closed.
+    """
+    global _SESSION, _SESSION_POOL_SIZE
+    if (session := _SESSION) is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                _SESSION = _build_session()
+                _SESSION_POOL_SIZE = POOL_SIZE
+            session = _SESSION
+    return session
+
+
+def configure_limiter(
+    interval: float = rate_limiter.DEFAULT_INTERVAL,
+    lock_dir: Path | None = None,
+) -> rate_limiter.RateLimiter:
+    """Replace the shared rate limiter.
+
+    `interval` is the default seconds per request per host; with
+    `lock_dir`, the limit is also shared with other processes.
+    """
+    global LIMITER
+    LIMITER = rate_limiter.RateLimiter(interval, lock_dir)
+    return LIMITER
+
+
+# Requests are always counted; set REDDIT_RESEARCH_METRICS to report them
+METRICS = metrics.Metrics()
+
+
+def configure_metrics(
+    summary: bool = True, jsonl: Path | None = None
+) -> metrics.Metrics:
+    """Replace the shared request metrics.
+
+    With `summary`, print totals to stderr at exit; with `jsonl`, also
+    append each request to that file as a JSON line.
+    """
+    global METRICS
+    METRICS.close()
+    METRICS = metrics.Metrics(jsonl)
+    atexit.unregister(report_metrics)
+    if summary:
+        atexit.register(report_metrics)
+    return METRICS
+
+
+def report_metrics() -> None:
+    """Print the request metrics summary to stderr."""
+    print(f"\n{METRICS.summary()}", file=sys.stderr)
+    METRICS.close()
+
+
+# "1" for a summary at exit, or a file to which requests are also written
+if metrics_env := os.getenv("REDDIT_RESEARCH_METRICS"):
+    configure_metrics(jsonl=None if metrics_env == "1" else Path(metrics_env))
+
+
+def fetch(
+    url: str, headers: dict[str, str] | None = None, check: bool = True
+) -> requests.Response:
+    """GET `url` through the shared session and rate limiter.
+
+    The session's adapter retries connection errors and other 5xx; here
+    we wait out 429s and 503s, and `Retry-After`, for as long as the
+    server asks. With `check`, raise on a final non-2xx status.
+
+    >>> from unittest import mock
+    >>> def reply(status):
+    ...     r = requests.models.Response()
+    ...     r.status_code, r.headers["Retry-After"], r._content = status, "0", b""
+    ...     return r
+    >>> replies = [reply(503), reply(200)]
+    >>> with mock.patch.object(get_session(), "get", side_effect=replies):
+    ...     fetch("http://localhost/").status_code
+    200
+    """
+    session = get_session()
+    with METRICS.request("fetch", url) as record:
+        for attempt in range(1, FETCH_ATTEMPTS + 1):
+            slept = LIMITER.acquire(url)
+            # after the first attempt, sleeps are mostly backing off
+            record.add("rate_wait" if attempt == 1 else "retry_wait", slept)
+            try:
+                with record.timing("network"):
+                    r = session.get(url, headers=headers, verify=True, timeout=TIMEOUT)
+            except requests.exceptions.RequestException as err:
+                record.errors += 1
+                if attempt == FETCH_ATTEMPTS:
+                    raise
+                wait = rate_limiter.DEFAULT_BACKOFF * 2 ** (attempt - 1)
+                log.critical(f"{err=} -- pausing {wait:.0f}s, {attempt=}")
+                LIMITER.bucket(url).pause(wait)
+                continue
+            record.statuses.append(r.status_code)
+            record.bytes += len(r.content)
+            LIMITER.update(url, r.headers, r.status_code)
+            if r.status_code in RETRY_STATUSES and attempt < FETCH_ATTEMPTS:
+                continue
+            if check:
+                r.raise_for_status()
+            return r
+    raise AssertionError("unreachable")  # loop always returns or raises
+
+
+def pushshift_url(path: str = "reddit/submission/search/") -> str:
+    """Return the URL of a Pushshift endpoint.
+
+    Set `$PUSHSHIFT_URL` to use a stand-in, e.g., `pushshift-server`.
+
+    >>> pushshift_url()
+    'https://api.pushshift.io/reddit/submission/search/'
+    """
+    base = os.environ.get("PUSHSHIFT_URL") or PUSHSHIFT_URL
+    return f"{base.rstrip('/')}/{path}"
+
+
+def pushshift_stand_in() -> bool:
+    """Return whether `$PUSHSHIFT_URL` points elsewhere than Pushshift.
+
+    A stand-in's answers aren't Pushshift's, so mustn't be kept as such.
+    """
+    base = os.environ.get("PUSHSHIFT_URL") or PUSHSHIFT_URL
+    return base.rstrip("/") != PUSHSHIFT_URL
+
+
+ENV_FN = Path.home() / ".config" / "api-info.env"
+
+
+@functools.cache
+def _load_credentials() -> None:
+    """Load the credentials file into the environment, once per process."""
+    if ENV_FN.exists():
+        # Make sure the file is not public for security's sake
+        if ENV_FN.stat().st_mode & 0o777 != 0o600:
+            print(f"WARNING: {ENV_FN} is not 0o600; fixing")
+            ENV_FN.chmod(0o600)
+        # Load from file; environment value wins unless `override=True`
+        dotenv.load_dotenv(dotenv_path=ENV_FN)
+
+
 def get_credential(key: str) -> str:
     """Retrieve credential from environ, file, or solicitation."""
-    ENV_FN = Path.home() / ".config" / "api-info.env"
-    # Make sure the file is not public for security's sake
-    if ENV_FN.stat().st_mode & 0o777 != 0o600:
-        print(f"WARNING: {ENV_FN} is not 0o600; fixing")
-        ENV_FN.chmod(0o600)
-
-    # Load from file; environment value wins unless `override=True`
-    dotenv.load_dotenv(dotenv_path=ENV_FN)
+    _load_credentials()
     if (value := os.getenv(key)) is None:
         value = input(f"Enter value for {key}: ").strip()
         dotenv.set_key(ENV_FN, key, value)
+        os.environ[key] = value
 
     return value
 
 
+@functools.cache
+def get_reddit() -> praw.Reddit:
+    """Return the process's PRAW client, built on first use.
+
+    Deferring this keeps imports, `--help`, and tests free of credential
+    I/O and client construction. Set `$REDDIT_API_URL` to use a stand-in.
+    """
+    import praw  # type: ignore # https://praw.readthedocs.io/en/latest
+
+    # e.g., `reddit-server`, a local stand-in
+    if api_url := os.environ.get("REDDIT_API_URL"):
+        kwargs = {"oauth_url": api_url, "reddit_url": api_url}
+    else:
+        kwargs = {}
+    return praw.Reddit(
+        user_agent=get_credential("REDDIT_USER_AGENT"),
+        client_id=get_credential("REDDIT_CLIENT_ID"),
+        client_secret=get_credential("REDDIT_CLIENT_SECRET"),
+        username=get_credential("REDDIT_USERNAME"),
+        password=get_credential("REDDIT_PASSWORD"),
+        ratelimit_seconds=600,
+        **kwargs,
+    )
+
+
 def escape_XML(text: str) -> str:  # http://wiki.python.org/moin/EscapingXml
     """Escape XML character entities; & < > are defaulted."""
+    from xml.sax import saxutils  # pulls in urllib.request
+
     extras = {"\t": "  "}
     return saxutils.escape(text, extras)
 
@@ -75,80 +390,121 @@ def unescape_XML(text: str) -> str:  # .0937s 4.11%
     return re.sub(r"&#?\w+;", fixup, text)
 
 
-@cachier.cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
-def get_HTML(
-    url: str,
-    referer: str = "",
-    data: str = "",
-    cookie: str = "",
-    retry_counter: int = 0,
-    rate_limit: int = 2,
-    cache_control: str = "",
-) -> tuple[bytes, Any, str, requests.models.Response]:
+def get_store() -> response_store.ResponseStore:
+    """Return the shared response store, opening it on first use.
+
+    Threads racing to first use share one store; none is closed.
+    """
+    global _STORE
+    if (store := _STORE) is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = response_store.ResponseStore()
+            store = _STORE
+    return store
+
+
+def configure_store(
+    path: Path = response_store.STORE_FN,
+    ttl: float | None = None,
+    max_bytes: int = response_store.MAX_BYTES,
+) -> response_store.ResponseStore:
+    """(Re)open the shared response store; `ttl` is in seconds."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is not None:
+            _STORE.close()
+        _STORE = response_store.ResponseStore(path, ttl, max_bytes)
+    return _STORE
+
+
+def _as_response(stored: response_store.StoredResponse) -> requests.Response:
+    """Rebuild a `requests.Response` from a stored one."""
+    r = requests.Response()
+    r.url = stored.url
+    r.status_code = stored.status
+    r.headers = requests.structures.CaseInsensitiveDict(stored.headers)
+    r._content = stored.body
+    return r
+
+
+def get_HTML(url: str) -> tuple[bytes, Any, str, requests.models.Response]:
     """Return [HTML content, response] of a given URL."""
-    time.sleep(rate_limit)
+    with METRICS.request("get_HTML", url) as record:
+        with record.timing("store"):
+            stored = get_store().get(url)
+        record.cache = "hit" if stored else "miss"
+        if stored:
+            r = _as_response(stored)
+        else:
+            AGENT_HEADERS = {
+                "User-Agent": "MacOS:reddit-query:v0.5 (by /u/reagle-reseach)"
+            }
+            r = fetch(url, headers=AGENT_HEADERS)
+        # info(f"{r.headers['content-type']=}")
+        if "html" in r.headers["content-type"]:
+            HTML_bytes = r.content
+        else:
+            raise OSError("URL content is not HTML.")
+        if not stored:
+            with record.timing("store"):
+                get_store().put(url, r.status_code, r.headers, HTML_bytes)
 
-    AGENT_HEADERS = {"User-Agent": "MacOS:reddit-query:v0.5 (by /u/reagle-reseach)"}
-    r = requests.get(url, headers=AGENT_HEADERS, verify=True)
-    # info(f"{r.headers['content-type']=}")
-    if "html" in r.headers["content-type"]:
-        HTML_bytes = r.content
-    else:
-        raise OSError("URL content is not HTML.")
+        import lxml.etree
 
-    parser_html = lxml.etree.HTMLParser()  # type: ignore
-    doc = lxml.etree.fromstring(HTML_bytes, parser_html)  # type: ignore
-    HTML_parsed = doc
+        with record.timing("parse"):
+            parser_html = lxml.etree.HTMLParser()  # type: ignore
+            doc = lxml.etree.fromstring(HTML_bytes, parser_html)  # type: ignore
+            HTML_parsed = doc
 
-    HTML_utf8 = lxml.etree.tostring(HTML_parsed, encoding="utf-8")  # type: ignore
-    HTML_unicode = HTML_utf8.decode("utf-8", "replace")
+            HTML_utf8 = lxml.etree.tostring(doc, encoding="utf-8")  # type: ignore
+            HTML_unicode = HTML_utf8.decode("utf-8", "replace")
 
     return HTML_bytes, HTML_parsed, HTML_unicode, r
 
 
-@cachier.cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
 def get_JSON(
     url: str,
-    referer: str = "",
-    data: str = "",
-    cookie: str = "",
-    retry_counter: int = 0,
-    rate_limit: int = 2,
-    cache_control: str = "",
     requested_content_type: str = "application/json",
+    *,
+    cached: bool = True,
 ) -> list | dict:  # some services return list some a dict
     """Return [JSON content, response] of a given URL.
 
-    Default rate limit is 2 seconds per request, though Pushshift
+    Responses are kept in the response store, so only misses are fetched
+    and wait on the rate limiter. Default is 2 seconds per request, though Pushshift
     can limit me down to 3 minutes!
     https://www.reddit.com/r/pushshift/comments/shg1sy/rate_limit/
+    Responses that may yet change, if not cached, bypass the store.
     """
-    time.sleep(rate_limit)
-
-    # TODO: put limiter here? https://github.com/shaypal5/cachier/issues/65
-    AGENT_HEADERS = {"User-Agent": "Reddit Tools https://github.com/reagle/reddit/"}
     log.info(f"{url=}")
-    # TODO: use a HTTPAdapter with max_retires
-    # https://findwork.dev/blog/advanced-usage-python-requests-timeouts-retries-hooks/#retry-on-failure
-
-    try:
-        r = requests.get(url, headers=AGENT_HEADERS, verify=True)
-        r.raise_for_status()
-    except requests.exceptions.RequestException as err:
-        log.critical(f"{err=} -- waiting 5 minutes, try again, quit if fail")
-        time.sleep(300)  # wait 5 minutes
-        r = requests.get(url, headers=AGENT_HEADERS, verify=True)
-        r.raise_for_status()
-    returned_content_type = r.headers["content-type"].split(";")[0]
-    log.info(f"{requested_content_type=} == {returned_content_type=}?")
-    if requested_content_type == returned_content_type:
-        json_content = json.loads(r.content)
+    with METRICS.request("get_JSON", url) as record:
+        stored = None
+        if cached:
+            with record.timing("store"):
+                stored = get_store().get(url)
+            record.cache = "hit" if stored else "miss"
+        if stored:
+            content_type, content = stored.headers["content-type"], stored.body
+        else:
+            AGENT_HEADERS = {
+                "User-Agent": "Reddit Tools https://github.com/reagle/reddit/"
+            }
+            r = fetch(url, headers=AGENT_HEADERS)
+            content_type, content = r.headers["content-type"], r.content
+        returned_content_type = content_type.split(";")[0]
+        log.info(f"{requested_content_type=} == {returned_content_type=}?")
+        if requested_content_type != returned_content_type:
+            raise OSError("URL content is not JSON.")
+        with record.timing("parse"):
+            json_content = json.loads(content)
+        if cached and not stored:
+            with record.timing("store"):
+                get_store().put(url, r.status_code, r.headers, content)
         return json_content
-    else:
-        raise OSError("URL content is not JSON.")
 
 
-@cachier.cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
+@lazy_cachier(pickle_reload=False)  # stale_after=dt.timedelta(days=7)
 def get_text(url: str) -> str:
     """Textual version of url."""
     return str(os.popen(f'w3m -O utf8 -cols 10000 -dump "{url}"').read())